@@ -34,14 +34,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'coworking.middleware.RequestMetricsMiddleware',
+    'coworking.middleware.SlowQueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'coworking.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'simple_history.middleware.HistoryRequestMiddleware',
+    'coworking.middleware.DeferredHistoryMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -72,6 +76,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Тестовая БД в файле: в памяти SQLite не ждёт снятия блокировок,
+        # а тесты параллельных бронирований работают из нескольких потоков
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -122,4 +131,68 @@ import os
 
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
-]
\ No newline at end of file
+]
+
+# Кэш. На нём держатся версии моделей кэша API (api_cache.py) и версии фрагментов страницы
+# коворкинга, поэтому на боевом сервере он должен быть общим для всех процессов: с LocMemCache
+# каждый воркер gunicorn видел бы только свои сбросы и отдавал устаревшие ответы до API_CACHE_TIMEOUT.
+# Для разработки (один процесс runserver) — LocMemCache; на боевом сервере задайте REDIS_URL,
+# manage.py check --deploy (проверка coworking.E001) требует Redis или Memcached
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Время жизни ответов API в кэше (сек.); изменения моделей сбрасывают кэш сразу через версию
+API_CACHE_TIMEOUT = 300
+
+# Фрагменты страницы коворкинга в кэше; ключ содержит версию, так что устаревшие просто истекают
+COWORKING_DETAIL_CACHE_TIMEOUT = 3600
+
+# Запись истории коворкингов и мест: None — сразу при save(), 'commit' — одним bulk_create
+# в конце запроса, 'queue' — фоновым потоком (coworking/history.py)
+HISTORY_DEFERRED = None
+
+# История старше стольких дней схлопывается и уходит в помесячные архивные таблицы
+# (manage.py compact_history)
+HISTORY_KEEP_DAYS = 180
+
+# Метрики запросов (число и время SQL, время ответа по view): заголовок Server-Timing
+# и /metrics для Prometheus (coworking/metrics.py). Server-Timing отдаётся только служебным
+# запросам (см. METRICS_TOKEN ниже). Выключено — middleware не подключается
+REQUEST_METRICS = False
+
+# Служебный доступ без входа — /metrics и заголовок PROFILE_HEADER (администраторам — всегда):
+# запрос с заголовком «Authorization: Bearer <METRICS_TOKEN>» или с адреса из METRICS_ALLOWED_IPS.
+# За обратным прокси (nginx) REMOTE_ADDR у всех клиентов — адрес прокси, поэтому
+# 127.0.0.1 и адрес прокси сюда не вносите: для сборщика Prometheus используйте токен
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = []
+
+# Выборочное профилирование запросов (coworking/profiling.py, manage.py profile_stacks).
+# Профилируются: доля запросов PROFILE_SAMPLE_RATE, пути по регулярным выражениям PROFILE_PATHS
+# и запросы с заголовком PROFILE_HEADER от администраторов и по METRICS_TOKEN / METRICS_ALLOWED_IPS.
+# Выключено — middleware не подключается
+PROFILE_REQUESTS = False
+PROFILE_SAMPLE_RATE = 0.01
+PROFILE_PATHS = []
+PROFILE_HEADER = 'X-Profile'
+# Период семплирования стека, сек.; меньше sys.getswitchinterval() (5 мс) смысла не имеет
+PROFILE_INTERVAL = 0.005
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_MAX_FILES = 1000
+
+# Журнал медленных SQL-запросов в логгер coworking.slow_queries (coworking/slow_queries.py):
+# нормализованный SQL, view или команда manage.py и план EXPLAIN; одинаковые запросы — счётчиком,
+# счётчики процесса по видам запросов — в разделе /metrics
+SLOW_QUERY_LOG = False
+SLOW_QUERY_THRESHOLD_MS = 100
@@ -1,10 +1,12 @@
 from django.contrib import admin
 from .models import (
-    Coworking, WorkplaceType, Workplace, Booking, BookingStatus,
-    Payment, PaymentStatus, CoworkingImage, WorkplaceImage, Review, UserFavorite
+    Coworking, WorkplaceType, Workplace, Booking, BookingSeries, BookingStatus,
+    Payment, PaymentStatus, CoworkingImage, WorkplaceImage, Review, UserFavorite, WorkplaceOccupancy,
+    DailyRevenue
 )
 from django.contrib.auth import get_user_model
 from import_export.admin import ImportExportModelAdmin
+from .resources import CoworkingBulkResource, CoworkingResource, WorkplaceBulkResource, WorkplaceResource
 
 User = get_user_model()
 
@@ -35,7 +37,9 @@ class UserFavoriteInline(admin.TabularInline):
 
 @admin.register(Coworking)
 class CoworkingAdmin(ImportExportModelAdmin):  # вместо admin.ModelAdmin
-    list_display = ('name', 'address', 'created_at', 'updated_at')
+    # режим импорта выбирается в форме: по одной строке или пачками (resources.py)
+    resource_classes = [CoworkingResource, CoworkingBulkResource]
+    list_display = ('name', 'address', 'rating_avg', 'rating_count', 'created_at', 'updated_at')
     list_filter = ('created_at',)
     search_fields = ('name', 'address')
     readonly_fields = ('created_at', 'updated_at')
@@ -48,7 +52,8 @@ class WorkplaceTypeAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(Workplace)
-class WorkplaceAdmin(admin.ModelAdmin):
+class WorkplaceAdmin(ImportExportModelAdmin):
+    resource_classes = [WorkplaceResource, WorkplaceBulkResource]
     list_display = ('name', 'coworking', 'workplace_type', 'price_per_hour', 'is_active', 'created_at')
     list_filter = ('coworking', 'workplace_type', 'is_active')
     search_fields = ('name',)
@@ -79,7 +84,7 @@ class BookingAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'workplace__name')
     readonly_fields = ('created_at', 'updated_at')
     # для foreign keys - выбор через поиск
-    raw_id_fields = ('user', 'workplace')
+    raw_id_fields = ('user', 'workplace', 'series')
     # фильтрация по дате создания сверху страницы
     date_hierarchy = 'created_at'
     #позволяет вывести вычиляемое свойство в таблице
@@ -91,6 +96,14 @@ class BookingAdmin(admin.ModelAdmin):
         )
 
 
+@admin.register(BookingSeries)
+class BookingSeriesAdmin(admin.ModelAdmin):
+    list_display = ('user', 'workplace', 'weekday', 'start_hour', 'end_hour', 'start_date', 'end_date')
+    list_filter = ('weekday',)
+    search_fields = ('user__username', 'workplace__name')
+    readonly_fields = ('created_at',)
+    raw_id_fields = ('user', 'workplace')
+
 @admin.register(PaymentStatus)
 class PaymentStatusAdmin(admin.ModelAdmin):
     list_display = ('name',)
@@ -117,3 +130,17 @@ class UserFavoriteAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'workplace__name')
     raw_id_fields = ('user', 'workplace')
     readonly_fields = ('added_at',)
+
+@admin.register(WorkplaceOccupancy)
+class WorkplaceOccupancyAdmin(admin.ModelAdmin):
+    list_display = ('workplace', 'date', 'busy_minutes')
+    list_filter = ('date',)
+    raw_id_fields = ('workplace',)
+    date_hierarchy = 'date'
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ('date', 'coworking', 'payment_method', 'status', 'amount', 'payments_count')
+    list_filter = ('status', 'payment_method', 'date')
+    raw_id_fields = ('coworking',)
+    date_hierarchy = 'date'
@@ -0,0 +1,168 @@
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import Booking, Workplace, WorkplaceOccupancy
+
+try:
+    import numpy as np
+except ImportError:  # аналитика — необязательная часть (numpy в requirements.txt), сайт работает и без неё
+    np = None
+
+# Загрузка рабочих мест: сколько минут каждого часа место было занято.
+# Период считается кусками по CHUNK_DAYS дней: брони куска читаются одним запросом в массивы
+# NumPy, занятость считается векторно по минутам (разностный массив + cumsum) и сохраняется
+# в WorkplaceOccupancy — строка на место и день, 24 значения по местным часам. Границы часов
+# берутся из меток времени местной полуночи и часов, так что день перевода часов (23 или 25 часов)
+# считается верно. Отчёты по часам и дням недели строятся уже из этих строк, без обращения к Booking.
+
+MINUTES_PER_DAY = 24 * 60
+# Сколько дней считаем за раз: и брони, и массивы мест × минут — только за этот кусок,
+# около 15 МБ на 500 мест
+CHUNK_DAYS = 7
+
+
+def require_numpy():
+    if np is None:
+        raise ImproperlyConfigured('Для аналитики загрузки нужен NumPy: pip install numpy')
+
+
+def local_time(day, hour=0):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+def hour_boundaries(first_day, days):
+    # Начала местных часов куска в минутах от его начала и в конце — длина куска в минутах.
+    # Несуществующий при переводе вперёд час совпадает со следующим и получает 0 минут
+    origin = local_time(first_day).timestamp()
+    moments = [local_time(first_day + timedelta(days=day), hour) for day in range(days) for hour in range(24)]
+    moments.append(local_time(first_day + timedelta(days=days)))
+    return np.array([int((moment.timestamp() - origin) // 60) for moment in moments], dtype=np.int64)
+
+
+def first_pending_day():
+    # Первый ещё не посчитанный день: следующий за последним в сводке или день первой брони
+    last = WorkplaceOccupancy.objects.aggregate(last=Max('date'))['last']
+    if last is not None:
+        return last + timedelta(days=1)
+    first = Booking.objects.aggregate(first=Min('start_time'))['first']
+    return None if first is None else timezone.localdate(first)
+
+
+def load_intervals(start, end):
+    # Брони, пересекающие [start, end): индексы в минутах от start, обрезанные по границам периода
+    workplace_ids, starts, ends = [], [], []
+    for workplace_id, start_time, end_time in Booking.objects.filter(
+        start_time__lt=end, end_time__gt=start
+    ).values_list('workplace_id', 'start_time', 'end_time').iterator(chunk_size=5000):
+        workplace_ids.append(workplace_id)
+        starts.append(start_time.timestamp())
+        ends.append(end_time.timestamp())
+    workplace_ids = np.array(workplace_ids, dtype=np.int64)
+    starts = np.array(starts, dtype=np.float64)
+    ends = np.array(ends, dtype=np.float64)
+    origin = start.timestamp()
+    total = int((end.timestamp() - origin) // 60)
+    starts = np.clip((starts - origin) // 60, 0, total).astype(np.int64)
+    ends = np.clip(np.ceil((ends - origin) / 60), 0, total).astype(np.int64)
+    return workplace_ids, starts, ends
+
+
+def occupancy_by_hour(rows, starts, ends, workplace_count, boundaries):
+    # -> массив (мест, часов): занятые минуты каждого часа между границами boundaries.
+    # Пересечения броней не удваиваются
+    minutes = int(boundaries[-1])
+    diff = np.zeros((workplace_count, minutes + 1), dtype=np.int16)
+    np.add.at(diff, (rows, starts), 1)
+    np.add.at(diff, (rows, ends), -1)
+    # Всё на месте, без временных массивов: кусок не длиннее 32767 минут, int16 хватает
+    np.cumsum(diff, axis=1, out=diff)
+    busy = diff[:, :minutes] > 0
+    # Накопленная сумма с нулём в начале: минуты часа — разность её значений на границах
+    diff[:, 0] = 0
+    np.cumsum(busy, axis=1, dtype=np.int16, out=diff[:, 1:])
+    return np.diff(diff[:, boundaries], axis=1)
+
+
+def refresh(date_from=None, date_to=None):
+    # Пересчитывает дни [date_from, date_to] (по умолчанию — только новые). Возвращает число дней
+    require_numpy()
+    if date_to is None:
+        # сегодняшний день ещё не закончился
+        date_to = timezone.localdate() - timedelta(days=1)
+    if date_from is None:
+        date_from = first_pending_day()
+    if date_from is None or date_from > date_to:
+        return 0
+
+    workplace_ids = np.array(sorted(Workplace.objects.values_list('id', flat=True)), dtype=np.int64)
+    if not len(workplace_ids):
+        return 0
+
+    total_days = (date_to - date_from).days + 1
+    for offset in range(0, total_days, CHUNK_DAYS):
+        first_day = date_from + timedelta(days=offset)
+        days = min(CHUNK_DAYS, total_days - offset)
+        booked, starts, ends = load_intervals(local_time(first_day), local_time(first_day + timedelta(days=days)))
+        known = np.isin(booked, workplace_ids)
+        hourly = occupancy_by_hour(
+            np.searchsorted(workplace_ids, booked[known]),
+            starts[known],
+            ends[known],
+            len(workplace_ids),
+            hour_boundaries(first_day, days),
+        )
+        save_chunk(workplace_ids, first_day, hourly.reshape(len(workplace_ids), days, 24))
+    return total_days
+
+
+def save_chunk(workplace_ids, first_day, hourly):
+    days = [first_day + timedelta(days=i) for i in range(hourly.shape[1])]
+    with transaction.atomic():
+        WorkplaceOccupancy.objects.filter(date__range=(days[0], days[-1])).delete()
+        WorkplaceOccupancy.objects.bulk_create([
+            WorkplaceOccupancy(
+                workplace_id=int(workplace_id),
+                date=day,
+                busy_minutes=int(hourly[i, j].sum()),
+                hourly=hourly[i, j].tolist(),
+            )
+            for i, workplace_id in enumerate(workplace_ids)
+            for j, day in enumerate(days)
+        ], batch_size=2000)
+
+
+def summarize(queryset):
+    # Отчёт по строкам WorkplaceOccupancy: доля занятого времени по местам, часам суток,
+    # дням недели и матрица день недели × час
+    require_numpy()
+    rows = list(queryset.values_list('workplace_id', 'date', 'hourly'))
+    if not rows:
+        return {'workplaces': [], 'by_hour': [], 'by_weekday': [], 'weekday_hour': []}
+
+    hourly = np.array([row[2] for row in rows], dtype=np.int64)
+    weekdays = np.array([row[1].weekday() for row in rows], dtype=np.int64)
+    ids, workplace_index = np.unique(np.array([row[0] for row in rows], dtype=np.int64), return_inverse=True)
+
+    busy = np.bincount(workplace_index, weights=hourly.sum(axis=1))
+    days = np.bincount(workplace_index)
+    by_weekday = np.zeros((7, 24), dtype=np.int64)
+    np.add.at(by_weekday, weekdays, hourly)
+    weekday_rows = np.bincount(weekdays, minlength=7)
+
+    def ratio(numerator, denominator):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.round(np.nan_to_num(numerator / denominator), 4).tolist()
+
+    return {
+        'workplaces': [
+            {'workplace': int(workplace_id), 'busy_minutes': int(minutes), 'utilization': utilization}
+            for workplace_id, minutes, utilization in zip(ids, busy, ratio(busy, days * MINUTES_PER_DAY))
+        ],
+        'by_hour': ratio(hourly.sum(axis=0), len(rows) * 60),
+        'by_weekday': ratio(by_weekday.sum(axis=1), weekday_rows * MINUTES_PER_DAY),
+        'weekday_hour': ratio(by_weekday, weekday_rows[:, None] * 60),
+    }
@@ -0,0 +1,115 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Error, Tags, register
+from rest_framework.response import Response
+
+from . import metrics
+
+# Кэш ответов API только для чтения. Ключ = модель + её версия + URL с параметрами.
+# Версию модели увеличивают сигналы post_save/post_delete (signals.py), поэтому после
+# любого изменения старые ключи просто перестают использоваться и истекают сами.
+# Версии лежат в том же кэше, поэтому на боевом сервере он должен быть общим для всех
+# процессов (CACHES в settings): иначе сброс версии в одном воркере не видят остальные.
+# Попадания и промахи считаются в памяти процесса (metrics.API_CACHE, раздел /metrics).
+
+KEY_PREFIX = 'api_cache'
+
+
+SHARED_BACKENDS = ('django.core.cache.backends.redis.', 'django.core.cache.backends.memcached.')
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    # manage.py check --deploy: LocMemCache не общий между процессами, DatabaseCache
+    # дороже самого запроса к API (запись в БД на каждое обращение, get+set вместо incr)
+    backend = settings.CACHES['default']['BACKEND']
+    if backend.startswith(SHARED_BACKENDS):
+        return []
+    return [Error(
+        f'Кэш по умолчанию — {backend}: сбросы кэша API не дойдут до других процессов или будут медленными',
+        hint='Задайте REDIS_URL или настройте в CACHES Redis либо Memcached',
+        id='coworking.E001',
+    )]
+
+
+def get_timeout():
+    return getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+
+def version_key(model):
+    return f'{KEY_PREFIX}:version:{model._meta.label_lower}'
+
+
+def get_version(model):
+    version = cache.get(version_key(model))
+    if version is None:
+        # Если счётчик вытеснен из кэша, начинаем с метки времени, а не с 1,
+        # чтобы не совпасть с версией, под которой ещё лежат старые ответы
+        version = time.time_ns()
+        if not cache.add(version_key(model), version, timeout=None):
+            version = cache.get(version_key(model), version)
+    return version
+
+
+def bump_version(model):
+    try:
+        cache.incr(version_key(model))
+    except ValueError:
+        cache.set(version_key(model), time.time_ns(), timeout=None)
+
+
+def response_key(model, request):
+    path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f'{KEY_PREFIX}:{model._meta.label_lower}:{get_version(model)}:{path}'
+
+
+def count(name):
+    metrics.API_CACHE.inc((('result', name),))
+
+
+def get_stats():
+    series = metrics.API_CACHE.series
+    return {name: series.get((('result', name),), 0) for name in ('hit', 'miss')}
+
+
+def to_plain(data):
+    # ReturnDict/ReturnList держат ссылку на сериализатор — в кэш кладём обычные dict/list
+    if isinstance(data, dict):
+        return {key: to_plain(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [to_plain(value) for value in data]
+    return data
+
+
+def cache_response(view_method):
+    # Кэшируем данные ответа до рендера: формат (JSON / browsable API) выбирается как обычно
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        key = response_key(model, request)
+        data = cache.get(key)
+        if data is not None:
+            count('hit')
+            return Response(data)
+
+        count('miss')
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, to_plain(response.data), get_timeout())
+        return response
+    return wrapper
+
+
+class CachedReadMixin:
+    # list и retrieve из кэша; дополнительные GET-действия оборачиваются @cache_response
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -7,6 +7,9 @@ app_name = 'coworking_api'
 router = DefaultRouter()
 router.register(r'coworkings', api_views.CoworkingViewSet)
 router.register(r'workplaces', api_views.WorkplaceViewSet)
+router.register(r'bookings', api_views.BookingViewSet)
+router.register(r'occupancy', api_views.OccupancyViewSet, basename='occupancy')
+router.register(r'revenue', api_views.RevenueViewSet, basename='revenue')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,59 +1,269 @@
-from rest_framework import viewsets, filters
+from rest_framework import filters, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Coworking, Workplace
-from .serializers import CoworkingSerializer, WorkplaceSerializer
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError, NotFound
+from django.db.models import Q, Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import timedelta
+from django.db import transaction
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from .models import Coworking, Workplace, Booking, BookingSeries, BookingStatus, WorkplaceOccupancy, DailyRevenue
+from .serializers import (
+    CoworkingSerializer, WorkplaceSerializer, BookingSerializer, BookingBatchSerializer,
+    BookingSeriesSerializer,
+)
+from .availability import existing_intervals, find_overlaps, lock_workplaces, overlaps_any, sweep_conflicts
+from .forms import BOOKING_CONFLICT_MESSAGE
+from .search import FullTextSearchFilter
+from .api_cache import CachedReadMixin, cache_response
+from .conditional import ConditionalGetMixin, action_validators, conditional_response
+from .fast_serializers import FastListMixin
+from . import analytics, revenue
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from django_filters.rest_framework import DjangoFilterBackend
 
 
+# ================== ORDERING ==================
+class IndexedOrderingFilter(filters.OrderingFilter):
+    # Дополняет сортировку до составного индекса модели, который начинается с запрошенных полей
+    # (?ordering=-rating_avg -> -rating_avg, -rating_count, -id по coworking_rating_idx):
+    # иначе SQLite досортировывает хвост во временном B-дереве. Без подходящего индекса —
+    # просто id в том же направлении, чтобы порядок был однозначен
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and request.query_params.get(self.ordering_param):
+            return complete_ordering(queryset.model, ordering)
+        return ordering
+
+
+def complete_ordering(model, ordering):
+    direction = '-' if ordering[0].startswith('-') else ''
+    fields = [name.lstrip('-') for name in ordering]
+    if 'id' in fields:
+        return ordering
+    # Индекс читается в одну сторону, поэтому только при одинаковом направлении всех полей
+    if all(name.startswith('-') == bool(direction) for name in ordering):
+        for index in model._meta.indexes:
+            if list(index.fields[:len(fields)]) == fields:
+                return [*ordering, *(f'{direction}{name}' for name in index.fields[len(fields):])]
+    return [*ordering, f'{direction}id']
+
+
 # ================== PAGINATION ==================
+class KeysetPagination(BasePagination):
+    # Постраничный вывод по ключу (created_at, id): без COUNT(*) и OFFSET,
+    # следующая страница — WHERE (created_at, id) > (последняя строка)
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        # Лишняя строка показывает, есть ли следующая страница
+        rows = list(self.get_window(queryset, request))
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_window(self, queryset, request):
+        # Курсор задаёт свой порядок (created_at, id) — сортировку ?ordering= и ранжирование
+        # ?search= он бы молча отбросил, поэтому такие сочетания — ошибка клиента
+        for param in (api_settings.ORDERING_PARAM, api_settings.SEARCH_PARAM):
+            if request.query_params.get(param):
+                raise ValidationError({param: f'Нельзя сочетать с постраничным выводом по ?{self.cursor_query_param}=.'})
+        queryset = queryset.order_by('created_at', 'pk')
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+            )
+        return queryset[:self.get_page_size(request) + 1]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        # строка страницы — объект модели или dict из .values() (быстрый путь списков)
+        if isinstance(last, dict):
+            position = last['created_at'], last['id']
+        else:
+            position = last.created_at, last.pk
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*position))
+
+    def encode_cursor(self, created_at, pk):
+        raw = f'{created_at.isoformat()}|{pk}'
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        # Пустой cursor — первая страница
+        if not cursor:
+            return None
+        try:
+            created_at, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 50
 
+    # По умолчанию — номера страниц; с параметром ?cursor= клиент переходит на постраничный вывод по ключу
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_validation_queryset(self, queryset, request):
+        # Строки, от которых зависит страница, — для ETag (conditional.py).
+        # В режиме курсора это только окно страницы: полный COUNT(*) здесь не нужен
+        if KeysetPagination.cursor_query_param in request.query_params:
+            window = KeysetPagination().get_window(queryset, request)
+            return queryset.model.objects.filter(pk__in=window.values('pk'))
+        return queryset
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
 # ================== VIEWSETS ==================
-class CoworkingViewSet(viewsets.ModelViewSet):
+class CoworkingViewSet(ConditionalGetMixin, CachedReadMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Coworking.objects.all()
     serializer_class = CoworkingSerializer
     pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter, IndexedOrderingFilter]
     search_fields = ['name', 'address', 'description']
+    # ?ordering=-rating_avg,-rating_count — по индексу coworking_rating_idx
+    ordering_fields = ['rating_avg', 'rating_count']
 
     # Дополнительный метод GET для коворкингов с названием "Центр"
     @action(methods=['get'], detail=False)
+    @conditional_response(action_validators)
+    @cache_response
     def centers(self, request):
-        queryset = self.get_queryset().filter(name__icontains="Центр")
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(self.list_data(self.get_centers_queryset()))
+
+    def get_centers_queryset(self):
+        return self.get_queryset().filter(name__icontains="Центр")
 
 
-class WorkplaceViewSet(viewsets.ModelViewSet):
+class WorkplaceViewSet(ConditionalGetMixin, CachedReadMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Workplace.objects.all()
     serializer_class = WorkplaceSerializer
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     filterset_fields = ['coworking', 'is_active']
     search_fields = ['name']
 
     # Q-запрос: рабочие места активные или цена < 500
     @action(methods=['get'], detail=False)
+    @conditional_response(action_validators)
+    @cache_response
     def active_or_cheap(self, request):
-        queryset = self.get_queryset().filter(Q(is_active=True) | Q(price_per_hour__lt=500))
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(self.list_data(self.get_active_or_cheap_queryset()))
+
+    def get_active_or_cheap_queryset(self):
+        return self.get_queryset().filter(Q(is_active=True) | Q(price_per_hour__lt=500))
 
     @action(methods=['get'], detail=False)
+    @conditional_response(action_validators)
+    @cache_response
     def smart_filter(self, request):
-        queryset = self.get_queryset().filter(
+        return Response(self.list_data(self.get_smart_filter_queryset()))
+
+    def get_smart_filter_queryset(self):
+        return self.get_queryset().filter(
             Q(is_active=True) &
             Q(price_per_hour__lt=1000) &
             ~Q(name__icontains='vip')
         )
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+
+    # Свободные на всё окно [start, end) рабочие места одним запросом (NOT EXISTS по Booking)
+    # GET /api/workplaces/available/?start=2025-01-10T10:00&end=2025-01-10T14:00&coworking=1&workplace_type=2
+    @action(methods=['get'], detail=False)
+    def available(self, request):
+        start = self._parse_datetime_param(request, 'start')
+        end = self._parse_datetime_param(request, 'end')
+        if start >= end:
+            raise ValidationError({'end': 'Время окончания должно быть позже времени начала.'})
+
+        conflicts = Booking.objects.filter(
+            workplace=OuterRef('pk'),
+            start_time__lt=end,
+            end_time__gt=start
+        )
+        queryset = self.get_queryset().filter(is_active=True).filter(~Exists(conflicts))
+
+        for name in ('coworking', 'workplace_type'):
+            value = request.query_params.get(name)
+            if not value:
+                continue
+            if not value.isdigit():
+                raise ValidationError({name: 'Ожидается числовой id.'})
+            queryset = queryset.filter(**{f'{name}_id': int(value)})
+
+        return Response(self.list_data(queryset))
+
+    def _parse_datetime_param(self, request, name):
+        value = request.query_params.get(name)
+        if not value:
+            raise ValidationError({name: 'Обязательный параметр.'})
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            # Формат верный, но такой даты нет (2025-02-30T10:00)
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Неверный формат даты и времени.'})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
 
     # & curl.exe -X POST http://127.0.0.1:8000/api/workplaces/1/deactivate/
     @action(methods=['post'], detail=True)
@@ -62,3 +272,205 @@ class WorkplaceViewSet(viewsets.ModelViewSet):
         workplace.is_active = False
         workplace.save()
         return Response({'status': 'Рабочее место деактивировано'})
+
+
+class BookingViewSet(viewsets.GenericViewSet):
+    queryset = Booking.objects.all()
+    serializer_class = BookingSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Booking.objects.filter(user=self.request.user)
+
+    # Пакетное бронирование: всё или ничего.
+    # POST /api/bookings/batch/ {"bookings": [{"workplace": 1, "start_time": "...", "end_time": "..."}, ...]}
+    @action(methods=['post'], detail=False)
+    def batch(self, request):
+        serializer = BookingBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['bookings']
+
+        workplaces = Workplace.objects.filter(is_active=True).in_bulk({item['workplace'] for item in items})
+        missing = sorted({item['workplace'] for item in items} - set(workplaces))
+        if missing:
+            raise ValidationError({'workplace': f'Рабочие места не найдены или неактивны: {missing}'})
+
+        # Пересечения внутри самого запроса
+        by_workplace = {}
+        for index, item in enumerate(items):
+            by_workplace.setdefault(item['workplace'], []).append(
+                (item['start_time'], item['end_time'], index)
+            )
+        conflicts = []
+        for intervals in by_workplace.values():
+            for index, other in find_overlaps(intervals).items():
+                conflicts.append({'index': index, 'detail': f'Пересекается с бронированием #{other} из запроса.'})
+        if conflicts:
+            return self.conflict_response(conflicts)
+
+        booking_status, _ = BookingStatus.objects.get_or_create(name='Активно')
+
+        with transaction.atomic():
+            lock_workplaces(by_workplace)
+            # Существующие брони всех затронутых мест — одним запросом
+            spans = {
+                workplace_id: (min(i[0] for i in intervals), max(i[1] for i in intervals))
+                for workplace_id, intervals in by_workplace.items()
+            }
+            existing = existing_intervals(spans)
+            conflicts = [
+                {'index': index, 'detail': BOOKING_CONFLICT_MESSAGE}
+                for index, item in enumerate(items)
+                if overlaps_any(existing[item['workplace']], item['start_time'], item['end_time'])
+            ]
+            if conflicts:
+                return self.conflict_response(conflicts)
+
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    user=request.user,
+                    workplace=workplaces[item['workplace']],
+                    start_time=item['start_time'],
+                    end_time=item['end_time'],
+                    status=booking_status,
+                    total_price=workplaces[item['workplace']].price_for(item['start_time'], item['end_time'])
+                )
+                for item in items
+            ])
+
+        return Response(BookingSerializer(bookings, many=True).data, status=status.HTTP_201_CREATED)
+
+    # Регулярное бронирование: одно место в один и тот же день недели на период.
+    # POST /api/bookings/recurring/ {"workplace": 1, "weekday": 1, "start_hour": 10, "end_hour": 14,
+    #                                "start_date": "...", "end_date": "...", "skip_conflicts": false}
+    # Брони места за весь период читаются одним запросом, даты серии сверяются с ними за один проход.
+    # По умолчанию при пересечениях ничего не создаётся (409 со списком дат),
+    # со skip_conflicts=true создаются свободные даты, занятые возвращаются в skipped
+    @action(methods=['post'], detail=False)
+    def recurring(self, request):
+        serializer = BookingSeriesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        skip_conflicts = serializer.validated_data.pop('skip_conflicts')
+        series = BookingSeries(user=request.user, **serializer.validated_data)
+        workplace = series.workplace
+
+        now = timezone.now()
+        occurrences = [
+            (start, end, day) for day, start, end in series.occurrences() if start >= now
+        ]
+        if not occurrences:
+            raise ValidationError('В выбранном периоде нет ни одной даты серии.')
+
+        booking_status, _ = BookingStatus.objects.get_or_create(name='Активно')
+
+        with transaction.atomic():
+            lock_workplaces([workplace.pk])
+            existing = existing_intervals({workplace.pk: (occurrences[0][0], occurrences[-1][1])})
+            conflicts = set(sweep_conflicts(occurrences, existing[workplace.pk]))
+            free = [occurrence for occurrence in occurrences if occurrence[2] not in conflicts]
+            if conflicts and (not skip_conflicts or not free):
+                return Response(
+                    {'detail': BOOKING_CONFLICT_MESSAGE, 'conflicts': sorted(conflicts)},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            series.save()
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    user=request.user,
+                    workplace=workplace,
+                    series=series,
+                    start_time=start,
+                    end_time=end,
+                    status=booking_status,
+                    total_price=workplace.price_for(start, end)
+                )
+                for start, end, _ in free
+            ])
+
+        return Response({
+            'series': BookingSeriesSerializer(series).data,
+            'bookings': BookingSerializer(bookings, many=True).data,
+            'skipped': sorted(conflicts),
+        }, status=status.HTTP_201_CREATED)
+
+    def conflict_response(self, conflicts):
+        conflicts.sort(key=lambda conflict: conflict['index'])
+        return Response({'conflicts': conflicts}, status=status.HTTP_409_CONFLICT)
+
+
+def parse_date_param(request, name, default):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Неверный формат даты, ожидается ГГГГ-ММ-ДД.'})
+    return parsed
+
+
+def parse_id_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: 'Ожидается числовой id.'})
+    return int(value)
+
+
+class OccupancyViewSet(viewsets.GenericViewSet):
+    # Загрузка рабочих мест по дневной сводке (analytics.py), только чтение.
+    # GET /api/occupancy/?date_from=2026-01-01&date_to=2026-01-31&coworking=1&workplace=2
+    # По умолчанию — последние 30 посчитанных дней
+    queryset = WorkplaceOccupancy.objects.all()
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        date_to = parse_date_param(request, 'date_to', timezone.localdate() - timedelta(days=1))
+        date_from = parse_date_param(request, 'date_from', date_to - timedelta(days=29))
+        if date_from > date_to:
+            raise ValidationError({'date_from': 'Начало периода позже его конца.'})
+
+        queryset = self.get_queryset().filter(date__range=(date_from, date_to))
+        coworking = parse_id_param(request, 'coworking')
+        if coworking is not None:
+            queryset = queryset.filter(workplace__coworking_id=coworking)
+        workplace = parse_id_param(request, 'workplace')
+        if workplace is not None:
+            queryset = queryset.filter(workplace_id=workplace)
+
+        try:
+            report = analytics.summarize(queryset)
+        except ImproperlyConfigured as e:
+            return Response({'detail': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'date_from': date_from, 'date_to': date_to, **report})
+
+
+class RevenueViewSet(viewsets.GenericViewSet):
+    # Выручка по дневной сводке (revenue.py), только чтение.
+    # GET /api/revenue/?date_from=2026-01-01&date_to=2026-01-31&coworking=1&payment_method=card&status=2
+    # По умолчанию — последние 30 дней, включая сегодняшний
+    queryset = DailyRevenue.objects.all()
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        date_to = parse_date_param(request, 'date_to', timezone.localdate())
+        date_from = parse_date_param(request, 'date_from', date_to - timedelta(days=29))
+        if date_from > date_to:
+            raise ValidationError({'date_from': 'Начало периода позже его конца.'})
+
+        queryset = self.get_queryset().filter(date__range=(date_from, date_to))
+        coworking = parse_id_param(request, 'coworking')
+        if coworking is not None:
+            queryset = queryset.filter(coworking_id=coworking)
+        payment_status = parse_id_param(request, 'status')
+        if payment_status is not None:
+            queryset = queryset.filter(status_id=payment_status)
+        payment_method = request.query_params.get('payment_method')
+        if payment_method:
+            queryset = queryset.filter(payment_method=payment_method)
+
+        return Response({'date_from': date_from, 'date_to': date_to, **revenue.report(queryset)})
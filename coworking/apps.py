@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoworkingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'coworking'
+
+    def ready(self):
+        # Подключаем обработчики сигналов
+        from . import signals  # noqa: F401
+        # Журнал медленных SQL-запросов (SLOW_QUERY_LOG в settings)
+        from . import slow_queries
+        slow_queries.install()
@@ -0,0 +1,172 @@
+from bisect import bisect_left
+from datetime import timedelta
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Booking, Workplace
+
+# Занятость рабочего места храним как отсортированные непересекающиеся интервалы,
+# а для вывода по дням — как 24-битные маски (бит h = занят час h).
+# Так стоимость построения busy_by_date зависит от числа броней, а не от их длины в часах.
+
+FULL_DAY_MASK = (1 << 24) - 1
+
+
+def merge_intervals(intervals):
+    # Сливаем пересекающиеся и соприкасающиеся интервалы (start, end)
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def hours_mask(first_hour, end_hour):
+    # Маска часов first_hour..end_hour-1
+    return ((1 << end_hour) - 1) & ~((1 << first_hour) - 1)
+
+
+@lru_cache(maxsize=1024)
+def mask_to_hours(mask):
+    return tuple(hour for hour in range(24) if mask >> hour & 1)
+
+
+def day_masks(intervals, tz=None):
+    tz = tz or timezone.get_current_timezone()
+    masks = {}
+    for start, end in merge_intervals(intervals):
+        start_local = timezone.localtime(start, tz)
+        end_local = timezone.localtime(end, tz)
+
+        day = start_local.date()
+        last_day = end_local.date()
+        first_hour = start_local.hour
+        # Неполный последний час тоже считается занятым
+        end_hour = end_local.hour
+        if end_local.minute or end_local.second or end_local.microsecond:
+            end_hour += 1
+
+        # Все дни, кроме последнего, заняты до конца суток
+        while day < last_day:
+            masks[day] = masks.get(day, 0) | hours_mask(first_hour, 24)
+            day += timedelta(days=1)
+            first_hour = 0
+
+        if end_hour > first_hour:
+            masks[day] = masks.get(day, 0) | hours_mask(first_hour, end_hour)
+    return masks
+
+
+def busy_by_date(intervals, tz=None):
+    # {'YYYY-MM-DD': [часы]} в локальном времени, дни по возрастанию
+    masks = day_masks(intervals, tz)
+    return {
+        day.strftime('%Y-%m-%d'): list(mask_to_hours(masks[day]))
+        for day in sorted(masks)
+    }
+
+
+def upcoming_bookings(workplace, exclude_booking=None):
+    bookings = Booking.objects.filter(
+        workplace=workplace,
+        end_time__gte=timezone.now() - timedelta(hours=1)
+    )
+    if exclude_booking is not None:
+        bookings = bookings.exclude(id=exclude_booking.id)
+    return bookings.order_by('start_time')
+
+
+def workplace_busy_by_date(workplace, exclude_booking=None):
+    # Берём только актуальные брони, без создания объектов модели
+    intervals = upcoming_bookings(workplace, exclude_booking).values_list('start_time', 'end_time')
+    return busy_by_date(intervals)
+
+
+def conflicting_bookings(workplace, start, end, exclude_booking=None):
+    conflicts = Booking.objects.filter(
+        workplace=workplace,
+        start_time__lt=end,
+        end_time__gt=start
+    )
+    if exclude_booking is not None:
+        conflicts = conflicts.exclude(id=exclude_booking.id)
+    return conflicts
+
+
+def has_conflicts(workplace, start, end, exclude_booking=None):
+    return conflicting_bookings(workplace, start, end, exclude_booking).exists()
+
+
+def lock_workplace(workplace):
+    # Сериализуем бронирования одного рабочего места: вызывать внутри transaction.atomic()
+    # до проверки пересечений. Брони других мест при этом не блокируются.
+    lock_workplaces([getattr(workplace, 'pk', workplace)])
+
+
+def lock_workplaces(workplace_ids):
+    # Блокируем несколько мест одним запросом, всегда в порядке id — без взаимных блокировок
+    workplace_ids = sorted(set(workplace_ids))
+    if connection.features.has_select_for_update:
+        list(Workplace.objects.select_for_update().filter(
+            pk__in=workplace_ids
+        ).order_by('pk').values_list('pk', flat=True))
+    else:
+        # SQLite не умеет блокировать строки — пустой UPDATE сразу берёт блокировку записи,
+        # остальные транзакции ждут её снятия
+        Workplace.objects.filter(pk__in=workplace_ids).update(id=F('id'))
+
+
+def existing_intervals(spans):
+    # spans: {workplace_id: (min start, max end)} -> {workplace_id: слитые интервалы броней}.
+    # Один запрос на все места
+    if not spans:
+        return {}
+    condition = Q()
+    for workplace_id, (start, end) in spans.items():
+        condition |= Q(workplace_id=workplace_id, start_time__lt=end, end_time__gt=start)
+    intervals = {workplace_id: [] for workplace_id in spans}
+    for workplace_id, start, end in Booking.objects.filter(condition).values_list(
+        'workplace_id', 'start_time', 'end_time'
+    ):
+        intervals[workplace_id].append((start, end))
+    return {workplace_id: merge_intervals(items) for workplace_id, items in intervals.items()}
+
+
+def overlaps_any(merged, start, end):
+    # merged — отсортированные непересекающиеся интервалы; кандидат один —
+    # последний из начавшихся раньше end
+    position = bisect_left(merged, (end,)) - 1
+    return position >= 0 and merged[position][1] > start
+
+
+def find_overlaps(intervals):
+    # intervals: [(start, end, метка)] -> {метка: метка пересекающегося интервала}.
+    # Проход по отсортированным интервалам: текущий пересекается с тем, у кого максимальный конец
+    overlaps = {}
+    holder = None
+    for interval in sorted(intervals, key=lambda interval: interval[0]):
+        if holder is not None and interval[0] < holder[1]:
+            overlaps.setdefault(interval[2], holder[2])
+            overlaps.setdefault(holder[2], interval[2])
+        if holder is None or interval[1] > holder[1]:
+            holder = interval
+    return overlaps
+
+
+def sweep_conflicts(occurrences, merged):
+    # occurrences: [(start, end, метка)] по возрастанию, без пересечений между собой;
+    # merged — слитые интервалы броней. Оба списка проходим одним указателем: O(n + m)
+    conflicts = []
+    position = 0
+    for start, end, tag in occurrences:
+        while position < len(merged) and merged[position][1] <= start:
+            position += 1
+        if position < len(merged) and merged[position][0] < end:
+            conflicts.append(tag)
+    return conflicts
@@ -0,0 +1,159 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .api_cache import get_version
+from .models import Coworking, CoworkingImage, Review, UserFavorite, Workplace, WorkplaceImage, WorkplaceType
+
+# Условные GET-запросы (If-None-Match / If-Modified-Since) по updated_at.
+# Валидаторы считаются агрегатами в один запрос, без сериализации и рендера;
+# при совпадении клиент получает 304 без тела.
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+def viewer_parts(request):
+    # Части HTML-страницы, зависящие от пользователя: шапка, ссылки админа, CSRF-токен в формах
+    user = request.user
+    if not user.is_authenticated:
+        return ('anonymous',)
+    return (user.pk, user.username, user.is_staff, request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+
+
+def related_stats(queryset, group_by, field):
+    # (максимум field, число строк) по связанной таблице — скалярные подзапросы для values_list
+    grouped = queryset.order_by().values(group_by)
+    return (
+        Subquery(grouped.annotate(value=Max(field)).values('value')),
+        Subquery(grouped.annotate(value=Count('pk')).values('value')),
+    )
+
+
+# -----------------------------
+# HTML-страницы (для django.views.decorators.http.condition)
+# -----------------------------
+
+def coworking_content_version(request, pk):
+    # Версия общей для всех части страницы коворкинга: сам коворкинг, места, фото, отзывы,
+    # а также версии типов мест и имён пользователей (сбрасываются сигналами, signals.py) —
+    # их названия тоже выводятся на странице.
+    # Запоминаем на request — её используют и ETag, и ключи кэша фрагментов во view
+    if not hasattr(request, '_coworking_versions'):
+        request._coworking_versions = {}
+    versions = request._coworking_versions
+    if pk not in versions:
+        coworking = OuterRef('pk')
+        row = Coworking.objects.filter(pk=pk).values_list(
+            'updated_at',
+            *related_stats(Workplace.objects.filter(coworking=coworking), 'coworking', 'updated_at'),
+            *related_stats(CoworkingImage.objects.filter(coworking=coworking), 'coworking', 'created_at'),
+            *related_stats(Review.objects.filter(coworking=coworking), 'coworking', 'created_at'),
+        ).first()
+        if row is None:
+            versions[pk] = None
+        else:
+            row += (get_version(WorkplaceType), get_version(User))
+            versions[pk] = hashlib.md5(str(row).encode()).hexdigest()
+    return versions[pk]
+
+
+def coworking_detail_etag(request, pk):
+    version = coworking_content_version(request, pk)
+    if version is None:
+        return None
+    favorites = ()
+    if request.user.is_authenticated:
+        favorites = UserFavorite.objects.filter(
+            workplace__coworking=pk, user=request.user
+        ).aggregate(changed=Max('added_at'), total=Count('pk')).values()
+    return make_etag('coworking', pk, version, *favorites, *viewer_parts(request))
+
+
+def workplace_detail_etag(request, pk):
+    workplace = OuterRef('pk')
+    stats = [*related_stats(WorkplaceImage.objects.filter(workplace=workplace), 'workplace', 'created_at')]
+    if request.user.is_authenticated:
+        stats += related_stats(
+            UserFavorite.objects.filter(workplace=workplace, user=request.user), 'workplace', 'added_at'
+        )
+    row = Workplace.objects.filter(pk=pk).values_list(
+        'updated_at', 'workplace_type__name', *stats
+    ).first()
+    if row is None:
+        return None
+    return make_etag('workplace', pk, *row, *viewer_parts(request))
+
+
+# -----------------------------
+# API (DRF viewsets)
+# -----------------------------
+
+def action_validators(view, request, *args, **kwargs):
+    # Для дополнительных списков (@action): MAX(updated_at) и COUNT(*) ровно по тому набору,
+    # который отдаёт действие, — его строит get_<действие>_queryset() вьюсета.
+    # Last-Modified не отдаём: удаление строки не меняет MAX(updated_at)
+    return queryset_validators(getattr(view, f'get_{view.action}_queryset')(), request)
+
+
+def page_validators(view, request, *args, **kwargs):
+    # Для постраничного list — по отфильтрованному набору; пагинатор может сузить его до окна страницы
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.paginator
+    if paginator is not None and hasattr(paginator, 'get_validation_queryset'):
+        queryset = paginator.get_validation_queryset(queryset, request)
+    return queryset_validators(queryset, request)
+
+
+def queryset_validators(queryset, request):
+    stats = queryset.order_by().aggregate(changed=Max('updated_at'), total=Count('pk'))
+    etag = make_etag(request.build_absolute_uri(), request.accepted_media_type, stats['changed'], stats['total'])
+    return etag, None
+
+
+def object_validators(view, request, *args, **kwargs):
+    lookup = kwargs.get(view.lookup_url_kwarg or view.lookup_field)
+    updated_at = view.get_queryset().filter(
+        **{view.lookup_field: lookup}
+    ).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None, None
+    etag = make_etag(request.build_absolute_uri(), request.accepted_media_type, updated_at)
+    return etag, int(updated_at.timestamp())
+
+
+def conditional_response(validators):
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = validators(self, request, *args, **kwargs)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                if etag:
+                    response['ETag'] = etag
+                if last_modified:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+class ConditionalGetMixin:
+    # Ставится в базовых классах левее CachedReadMixin: 304 отдаём ещё до обращения к кэшу
+    @conditional_response(page_validators)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(object_validators)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
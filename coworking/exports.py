@@ -0,0 +1,102 @@
+import csv
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Booking
+
+# Выгрузка бронирований вместе с оплатой, местом и коворкингом для бухгалтерии.
+# Строки читаются через .values_list().iterator(): без объектов модели и без загрузки
+# всей выборки в память — память постоянна при любом числе строк.
+
+CHUNK_SIZE = 2000
+
+# (заголовок колонки, поле для values_list)
+COLUMNS = [
+    ('booking_id', 'id'),
+    ('created_at', 'created_at'),
+    ('user', 'user__username'),
+    ('coworking_id', 'workplace__coworking_id'),
+    ('coworking', 'workplace__coworking__name'),
+    ('workplace_id', 'workplace_id'),
+    ('workplace', 'workplace__name'),
+    ('start_time', 'start_time'),
+    ('end_time', 'end_time'),
+    ('total_price', 'total_price'),
+    ('booking_status', 'status__name'),
+    ('payment_amount', 'payment__amount'),
+    ('payment_method', 'payment__payment_method'),
+    ('payment_date', 'payment__payment_date'),
+    ('payment_status', 'payment__status__name'),
+]
+HEADERS = [header for header, _ in COLUMNS]
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_rows(date_from=None, date_to=None, coworking=None):
+    # Период — по локальной дате начала брони, обе границы включительно
+    bookings = Booking.objects.all()
+    if date_from is not None:
+        bookings = bookings.filter(start_time__gte=local_midnight(date_from))
+    if date_to is not None:
+        bookings = bookings.filter(start_time__lt=local_midnight(date_to + timedelta(days=1)))
+    if coworking is not None:
+        bookings = bookings.filter(workplace__coworking_id=coworking)
+    # Порядок по первичному ключу — базе не нужно сортировать всю выборку перед отдачей
+    rows = bookings.order_by('id').values_list(*[field for _, field in COLUMNS])
+    return rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def to_plain(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class Echo:
+    # csv.writer пишет строку сюда и сразу получает её обратно
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADERS)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(['' if value is None else to_plain(value) for value in row]))
+        if len(chunk) == CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def ndjson_lines(rows):
+    chunk = []
+    for row in rows:
+        item = dict(zip(HEADERS, map(to_plain, row)))
+        chunk.append(json.dumps(item, ensure_ascii=False) + '\n')
+        if len(chunk) == CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export_lines(export_format, rows):
+    if export_format == 'csv':
+        return csv_lines(rows)
+    return ndjson_lines(rows)
@@ -0,0 +1,166 @@
+import decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+
+# Быстрый путь для списков: строки берутся через .values() без создания объектов модели,
+# а каждое поле превращается в JSON-значение заранее подобранной функцией.
+# Результат совпадает с ModelSerializer байт в байт (ключи в том же порядке, те же значения).
+
+# Поля, для которых значение из БД уже совпадает с представлением DRF
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ReadOnlyField,
+)
+
+# Поля, которые считаются своим to_representation без обращения к объекту
+VALUE_FIELDS = (
+    serializers.DateField,
+    serializers.DateTimeField,
+    serializers.DecimalField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.TimeField,
+)
+
+
+class ValuesSerializer:
+    def __init__(self, model, converters):
+        self.model = model
+        # [(ключ ответа, ключ в .values(), фабрика функции преобразования или None)]
+        self.converters = converters
+        self.columns = [column for _, column, _ in converters]
+
+    def to_representation(self, rows):
+        # Фабрики вызываются один раз на ответ: часовой пояс и т.п. определяются не на каждое значение
+        converters = [
+            (key, column, factory() if factory else None)
+            for key, column, factory in self.converters
+        ]
+        data = []
+        for row in rows:
+            item = {}
+            for key, column, convert in converters:
+                value = row[column]
+                item[key] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+
+def datetime_factory(field):
+    # DateTimeField.to_representation ищет текущий часовой пояс для каждого значения
+    if getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() != ISO_8601:
+        return None
+    if hasattr(field, 'timezone') or not settings.USE_TZ:
+        return None
+
+    def factory():
+        tz = timezone.get_current_timezone()
+
+        def convert(value):
+            if timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+    return factory
+
+
+def decimal_factory(field):
+    # DecimalField.to_representation копирует контекст decimal для каждого значения
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return None
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+
+    def factory():
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+
+        def convert(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            return f'{value.quantize(exponent, rounding=field.rounding, context=context):f}'
+        return convert
+    return factory
+
+
+def compile_field(model, field):
+    # Возвращает (колонка, фабрика) или None, если поле нельзя вывести из одной колонки
+    if field.source == '*' or '.' in field.source:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if model_field.many_to_many or model_field.one_to_many or not model_field.concrete:
+        return None
+
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # DRF отдаёт pk связанного объекта — это значение *_id колонки
+        if field.pk_field is not None:
+            return None
+        return model_field.attname, None
+    if type(field) is serializers.DateTimeField:
+        factory = datetime_factory(field)
+    elif type(field) is serializers.DecimalField:
+        factory = decimal_factory(field)
+    else:
+        factory = None
+    if factory is not None:
+        return model_field.attname, factory
+    if isinstance(field, VALUE_FIELDS):
+        return model_field.attname, lambda: field.to_representation
+    if type(field) in IDENTITY_FIELDS:
+        return model_field.attname, None
+    return None
+
+
+_compiled = {}
+
+
+def get_values_serializer(serializer_class):
+    # None — у сериализатора есть поля, которые быстрый путь не поддерживает
+    if serializer_class not in _compiled:
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        converters = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            compiled = compile_field(model, field)
+            if compiled is None:
+                converters = None
+                break
+            converters.append((name, *compiled))
+        _compiled[serializer_class] = ValuesSerializer(model, converters) if converters else None
+    return _compiled[serializer_class]
+
+
+class FastListMixin:
+    # list и GET-действия со списками отдают строки из .values() вместо экземпляров модели
+    def list(self, request, *args, **kwargs):
+        fast = get_values_serializer(self.get_serializer_class())
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = self.filter_queryset(self.get_queryset()).values(*fast.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.to_representation(page))
+        return Response(fast.to_representation(rows))
+
+    def list_data(self, queryset):
+        # Для действий без пагинации (centers, active_or_cheap, smart_filter, available)
+        fast = get_values_serializer(self.get_serializer_class())
+        if fast is None:
+            return self.get_serializer(queryset, many=True).data
+        return fast.to_representation(queryset.values(*fast.columns))
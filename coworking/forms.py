@@ -10,7 +10,9 @@ from .models import (
 )
 from .models import Payment, PaymentStatus
 from django.utils import timezone
+from django.db import transaction
 from datetime import datetime, time, timedelta
+from .availability import has_conflicts
 
 class CoworkingForm(forms.ModelForm):
     class Meta:
@@ -42,6 +44,8 @@ class WorkplaceImageForm(forms.ModelForm):
 
 HOUR_CHOICES = [(h, f"{h}:00") for h in range(0, 24)]
 
+BOOKING_CONFLICT_MESSAGE = 'Рабочее место уже забронировано на выбранное время.'
+
 
 class BookingForm(forms.Form):
     date_start = forms.DateField(
@@ -91,16 +95,9 @@ class BookingForm(forms.Form):
         if start_dt >= end_dt:
             raise forms.ValidationError('Время окончания должно быть позже времени начала.')
 
-        # Проверка пересечений
-        conflicts = Booking.objects.filter(
-            workplace=self.workplace,
-            start_time__lt=end_dt,
-            end_time__gt=start_dt
-        )
-        if self.booking:
-            conflicts = conflicts.exclude(id=self.booking.id)
-        if conflicts.exists():
-            raise forms.ValidationError('Рабочее место уже забронировано на выбранное время.')
+        # Предварительная проверка пересечений; окончательная — под блокировкой во view
+        if has_conflicts(self.workplace, start_dt, end_dt, exclude_booking=self.booking):
+            raise forms.ValidationError(BOOKING_CONFLICT_MESSAGE)
 
         cleaned['start_time'] = start_dt
         cleaned['end_time'] = end_dt
@@ -124,8 +121,12 @@ class PaymentForm(forms.ModelForm):
         payment.amount = self.booking.total_price
         # По умолчанию статус "частично/не оплачен"
         payment.status, _ = PaymentStatus.objects.get_or_create(name='не оплачен')
+        if payment.payment_date is None:
+            payment.payment_date = timezone.now()
         if commit:
-            payment.save()
+            # платёж и выручка за день (signals.py) сохраняются вместе
+            with transaction.atomic():
+                payment.save()
         return payment
 
 class ReviewForm(forms.ModelForm):
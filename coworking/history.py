@@ -0,0 +1,168 @@
+import atexit
+import logging
+import queue
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+from simple_history.signals import post_create_historical_record, pre_create_historical_record
+
+# Отложенная запись истории simple_history для горячих путей (save() в API и формах).
+# Режим задаётся настройкой HISTORY_DEFERRED:
+#   None    — как обычно, отдельный INSERT в таблицу истории на каждый save();
+#   'commit' — записи копятся в пределах запроса (DeferredHistoryMiddleware) или блока
+#              deferred_history() и пишутся одним bulk_create на модель в конце;
+#   'queue'  — то же, но bulk_create выполняет фоновый поток процесса, вне пути запроса.
+# Пользователь (HistoryRequestMiddleware) и время изменения запоминаются в момент save(),
+# записи из откатившихся транзакций и точек сохранения отбрасываются.
+# Сигналы simple_history те же, что и без отложенной записи: pre_create_historical_record —
+# в момент save(), post_create_historical_record — после bulk_create (в режиме 'queue' —
+# в фоновом потоке). Модели с историей m2m пишутся как обычно: их записям нужен id сразу.
+# build_historical_record повторяет HistoricalRecords.create_historical_record из
+# django-simple-history 3.13 (версия закреплена в requirements.txt, совпадение проверяет тест).
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_local = threading.local()
+
+
+def get_mode():
+    return getattr(settings, 'HISTORY_DEFERRED', None) or None
+
+
+class DeferredHistoricalRecords(HistoricalRecords):
+    def create_historical_record(self, instance, history_type, using=None):
+        records = getattr(_local, 'records', None)
+        if records is None or self.m2m_fields:
+            return super().create_historical_record(instance, history_type, using=using)
+
+        pending = self.build_historical_record(instance, history_type, using)
+        if transaction.get_connection(using).in_atomic_block:
+            # Попадёт в буфер только после коммита; при откате колбэк отбрасывается
+            transaction.on_commit(lambda: records.append(pending), using=using)
+        else:
+            records.append(pending)
+
+    def build_historical_record(self, instance, history_type, using=None):
+        # То же, что create_historical_record, но без сохранения:
+        # -> (запись истории, аргументы для post_create_historical_record)
+        using = using if self.use_base_model_db else None
+        history_date = getattr(instance, '_history_date', timezone.now())
+        history_user = self.get_history_user(instance)
+        history_change_reason = self.get_change_reason_for_object(instance, history_type, using)
+        manager = getattr(instance, self.manager_name)
+
+        attrs = {field.attname: getattr(instance, field.attname) for field in self.fields_included(instance)}
+        if getattr(manager.model, 'history_relation', None) is not None:
+            attrs['history_relation'] = instance
+
+        history_instance = manager.model(
+            history_date=history_date,
+            history_type=history_type,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            **attrs,
+        )
+        signal_kwargs = {
+            'instance': instance,
+            'history_date': history_date,
+            'history_user': history_user,
+            'history_change_reason': history_change_reason,
+            'using': using,
+        }
+        pre_create_historical_record.send(
+            sender=manager.model, history_instance=history_instance, **signal_kwargs
+        )
+        return history_instance, signal_kwargs
+
+
+@contextmanager
+def deferred_history(using=None):
+    # Область накопления записей: запрос (см. middleware.py), команда, задача.
+    # Вложенные области пишут в буфер внешней
+    if not get_mode() or getattr(_local, 'records', None) is not None:
+        yield
+        return
+
+    _local.records = records = []
+    try:
+        yield
+    finally:
+        _local.records = None
+        if transaction.get_connection(using).in_atomic_block:
+            # Записи текущей транзакции добавятся колбэками on_commit — сбрасываем после них
+            transaction.on_commit(lambda: flush(records), using=using)
+        else:
+            flush(records)
+
+
+def flush(records):
+    if not records:
+        return
+    if get_mode() == 'queue':
+        enqueue(list(records))
+    else:
+        write_records(records)
+
+
+def write_records(records):
+    # records — пары (запись истории, аргументы post_create_historical_record)
+    by_model = defaultdict(list)
+    for record, signal_kwargs in records:
+        by_model[type(record)].append((record, signal_kwargs))
+    for model, items in by_model.items():
+        model.objects.bulk_create([record for record, _ in items], batch_size=BATCH_SIZE)
+        for record, signal_kwargs in items:
+            post_create_historical_record.send(sender=model, history_instance=record, **signal_kwargs)
+
+
+# -----------------------------
+# Фоновая запись ('queue')
+# -----------------------------
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(records):
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=work, name='history-writer', daemon=True)
+            _worker.start()
+    _queue.put(records)
+
+
+def work():
+    while True:
+        batches = [_queue.get()]
+        # Всё, что успело накопиться, пишем одним bulk_create
+        while True:
+            try:
+                batches.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            write_records([record for batch in batches for record in batch])
+        except Exception:
+            logger.exception('Не удалось записать историю изменений (%s записей)', sum(map(len, batches)))
+        finally:
+            close_old_connections()
+            for _ in batches:
+                _queue.task_done()
+
+
+def wait_for_history():
+    # Дождаться записи всего, что стоит в очереди (завершение процесса, тесты)
+    _queue.join()
+
+
+# Один раз на процесс, а не при каждом перезапуске потока записи
+atexit.register(wait_for_history)
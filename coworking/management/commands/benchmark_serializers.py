@@ -0,0 +1,82 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from coworking.fast_serializers import get_values_serializer
+from coworking.models import Coworking, Workplace, WorkplaceType
+from coworking.serializers import CoworkingSerializer, WorkplaceSerializer
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает ModelSerializer и быстрый путь через .values() на списках разного размера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[50, 500, 5000])
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов на каждый замер')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"модель":<12}{"строк":>8}{"ModelSerializer, мс":>22}{"values(), мс":>16}{"ускорение":>12}')
+        for rows in options['rows']:
+            # Тестовые данные создаём в транзакции и откатываем
+            with transaction.atomic():
+                coworking = self.seed(rows)
+                self.compare(
+                    'Coworking', rows, CoworkingSerializer,
+                    Coworking.objects.filter(name__startswith='benchmark ').order_by('pk'),
+                    options['repeat']
+                )
+                self.compare(
+                    'Workplace', rows, WorkplaceSerializer,
+                    Workplace.objects.filter(coworking=coworking).order_by('pk'),
+                    options['repeat']
+                )
+                transaction.set_rollback(True)
+
+    def seed(self, rows):
+        coworkings = Coworking.objects.bulk_create([
+            Coworking(name=f'benchmark {i}', address=f'Адрес {i}', description='Описание ' * 20)
+            for i in range(rows)
+        ])
+        coworking = coworkings[0] if coworkings[0].pk else Coworking.objects.filter(name='benchmark 0').first()
+        workplace_type, _ = WorkplaceType.objects.get_or_create(name='Стол')
+        Workplace.objects.bulk_create([
+            Workplace(
+                name=f'Место {i}',
+                coworking=coworking,
+                workplace_type=workplace_type,
+                price_per_hour=100 + i % 900
+            )
+            for i in range(rows)
+        ])
+        return coworking
+
+    def compare(self, label, rows, serializer_class, queryset, repeat):
+        renderer = JSONRenderer()
+        fast = get_values_serializer(serializer_class)
+        if fast is None:
+            raise CommandError(f'{serializer_class.__name__} не поддерживается быстрым путём')
+
+        def model_path():
+            return renderer.render(serializer_class(queryset.all(), many=True).data)
+
+        def values_path():
+            return renderer.render(fast.to_representation(queryset.values(*fast.columns)))
+
+        if model_path() != values_path():
+            raise CommandError(f'{label}: ответы быстрого пути отличаются от ModelSerializer')
+
+        slow = measure(model_path, repeat)
+        quick = measure(values_path, repeat)
+        self.stdout.write(f'{label:<12}{rows:>8}{slow:>22.2f}{quick:>16.2f}{slow / quick:>11.1f}x')
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
@@ -0,0 +1,250 @@
+import json
+import math
+import re
+import statistics
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from coworking.models import Booking, Coworking, CoworkingImage, Payment, Review, Workplace, WorkplaceImage
+
+# Замер всех страниц и API приложения на текущих данных (см. seed_data).
+# Каждый URL запрашивается GET-ом от имени владельца одной из броней, временно ставшего
+# администратором: всё выполняется в транзакции, которая откатывается в конце,
+# так что и права, и побочные эффекты GET (favorite_add) в базе не остаются.
+
+URLCONFS = ['coworking.urls', 'coworking.api_urls']
+
+# Какой объект подставлять в <pk> веб-страниц — по началу маршрута, более длинные префиксы первыми
+PK_MODELS = [
+    ('coworking/image/', CoworkingImage),
+    ('workplace/image/', WorkplaceImage),
+    ('coworking/', Coworking),
+    ('workplace/', Workplace),
+    ('bookings/', Booking),
+]
+KWARG_MODELS = {
+    'coworking_id': Coworking,
+    'workplace_id': Workplace,
+    'booking_id': Booking,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа (перцентили) и число SQL-запросов для каждого URL из coworking/urls.py '
+        'и coworking/api_urls.py, сохраняет результат в JSON и сравнивает с прошлым прогоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Замеров на URL')
+        parser.add_argument('--warmup', type=int, default=2, help='Прогревочных запросов на URL (не учитываются)')
+        parser.add_argument('--only', help='Регулярное выражение: замерять только подходящие имена URL')
+        parser.add_argument('--exclude', help='Регулярное выражение: пропустить подходящие имена URL')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом (весь кэш — не запускайте на общем кэше боевого сервера)'
+        )
+        parser.add_argument('--output', help='Куда сохранить JSON (по умолчанию benchmarks/urls-<время>.json)')
+        parser.add_argument('--compare', help='JSON прошлого прогона: показать регрессии и завершиться с ошибкой')
+        parser.add_argument('--threshold', type=float, default=1.25, help='Во сколько раз p50 может вырасти без регрессии')
+
+    def handle(self, *args, **options):
+        if options['repeat'] <= 0:
+            raise CommandError('--repeat должен быть больше 0')
+        booking = Booking.objects.select_related('workplace').order_by('pk').first()
+        if booking is None:
+            raise CommandError('В базе нет бронирований — сначала запустите seed_data')
+        self.options = options
+
+        with transaction.atomic():
+            User.objects.filter(pk=booking.user_id).update(is_staff=True, is_superuser=True)
+            client = Client(SERVER_NAME=get_host())
+            client.force_login(User.objects.get(pk=booking.user_id))
+            samples = {
+                Booking: booking,
+                Workplace: booking.workplace,
+                Coworking: booking.workplace.coworking,
+                CoworkingImage: CoworkingImage.objects.order_by('pk').first(),
+                WorkplaceImage: WorkplaceImage.objects.order_by('pk').first(),
+            }
+            results = {}
+            self.stdout.write(f'{"URL":<42}{"код":>5}{"запросов":>10}{"p50, мс":>10}{"p90, мс":>10}{"p99, мс":>10}')
+            for name, url in self.endpoints(samples):
+                results[name] = result = self.measure(client, url)
+                self.stdout.write(
+                    f'{name:<42}{result["status"]:>5}{result["queries"]:>10}'
+                    f'{result["p50"]:>10.1f}{result["p90"]:>10.1f}{result["p99"]:>10.1f}'
+                )
+            transaction.set_rollback(True)
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'cold': options['cold'],
+            'rows': {model.__name__: model.objects.count() for model in (Coworking, Workplace, Booking, Payment, Review)},
+            'results': results,
+        }
+        path = self.save(report)
+        self.stdout.write(self.style.SUCCESS(f'Результат: {path}'))
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+    def endpoints(self, samples):
+        # -> (namespace:name, url) для каждого маршрута, в который есть что подставить
+        only = self.options['only'] and re.compile(self.options['only'])
+        exclude = self.options['exclude'] and re.compile(self.options['exclude'])
+        seen = set()
+        for urlconf in URLCONFS:
+            module = import_module(urlconf)
+            for route, pattern in walk(module.urlpatterns):
+                name = f'{module.app_name}:{pattern.name}'
+                kwargs_names = list(pattern.pattern.regex.groupindex)
+                # Варианты DRF с суффиксом формата (.json) повторяют основной маршрут
+                if not pattern.name or name in seen or 'format' in kwargs_names:
+                    continue
+                # Действия вьюсетов только для POST (batch, recurring) GET-ом не замерить
+                actions = getattr(pattern.callback, 'actions', None)
+                if actions is not None and 'get' not in actions:
+                    continue
+                if (only and not only.search(name)) or (exclude and exclude.search(name)):
+                    continue
+                seen.add(name)
+                kwargs = {}
+                for kwarg in kwargs_names:
+                    sample = samples.get(sample_model(route, pattern, kwarg))
+                    if sample is None:
+                        self.stdout.write(f'{name:<42}пропущен: нет объекта для <{kwarg}>')
+                        break
+                    kwargs[kwarg] = sample.pk
+                else:
+                    url = reverse(name, kwargs=kwargs)
+                    params = query_params().get(name)
+                    yield name, f'{url}?{urlencode(params)}' if params else url
+
+    def measure(self, client, url):
+        for _ in range(self.options['warmup']):
+            self.request(client, url)
+        # Запросы считаем отдельным прогоном: запись SQL в CaptureQueriesContext искажает время.
+        # При DEBUG журнал запросов ограничен 9000 записями — заполненный он не растёт и счёт был бы 0
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            status = self.request(client, url)
+        # Следующий запрос снова очистит журнал (сигнал request_started) — считаем сразу
+        query_count = len(queries)
+        sql_ms = sum(float(query['time']) for query in queries.captured_queries) * 1000
+        timings = []
+        for _ in range(self.options['repeat']):
+            started = time.perf_counter()
+            self.request(client, url)
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'url': url,
+            'status': status,
+            'queries': query_count,
+            'sql_ms': round(sql_ms, 2),
+            'mean': round(statistics.mean(timings), 2),
+            'p50': round(percentile(timings, 50), 2),
+            'p90': round(percentile(timings, 90), 2),
+            'p99': round(percentile(timings, 99), 2),
+            'max': round(max(timings), 2),
+        }
+
+    def request(self, client, url):
+        if self.options['cold']:
+            cache.clear()
+        response = client.get(url)
+        # Потоковые ответы (выгрузка броней) замеряем целиком, а не до первого байта
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def save(self, report):
+        if self.options['output']:
+            path = settings.BASE_DIR / self.options['output']
+        else:
+            path = settings.BASE_DIR / 'benchmarks' / f'urls-{timezone.localtime():%Y%m%d-%H%M%S}.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        return path
+
+    def compare(self, report, previous_path):
+        try:
+            with open(previous_path, encoding='utf-8') as f:
+                previous = json.load(f)['results']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Не удалось прочитать {previous_path}: {e}')
+
+        regressions = []
+        for name, result in report['results'].items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            if result['status'] != before['status']:
+                regressions.append(f'{name}: код ответа {before["status"]} -> {result["status"]}')
+            if result['queries'] > before['queries']:
+                regressions.append(f'{name}: запросов {before["queries"]} -> {result["queries"]}')
+            if before['p50'] and result['p50'] / before['p50'] > self.options['threshold']:
+                regressions.append(f'{name}: p50 {before["p50"]} -> {result["p50"]} мс')
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(line))
+        if regressions:
+            raise CommandError(f'Регрессий относительно {previous_path}: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS(f'Регрессий относительно {previous_path} нет'))
+
+
+def walk(patterns, prefix=''):
+    # Раскрывает include(): -> (маршрут целиком, URLPattern)
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from walk(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern
+
+
+def sample_model(route, pattern, kwarg):
+    if kwarg in KWARG_MODELS:
+        return KWARG_MODELS[kwarg]
+    # Маршруты DRF: модель берём из queryset вьюсета
+    viewset = getattr(pattern.callback, 'cls', None)
+    if getattr(viewset, 'queryset', None) is not None:
+        return viewset.queryset.model
+    for prefix, model in PK_MODELS:
+        if route.startswith(prefix):
+            return model
+    return None
+
+
+def query_params():
+    # Обязательные параметры запроса для маршрутов, которые без них отвечают 400
+    tomorrow = timezone.localdate() + timedelta(days=1)
+    return {
+        'coworking_api:workplace-available': {'start': f'{tomorrow}T10:00', 'end': f'{tomorrow}T14:00'},
+    }
+
+
+def get_host():
+    # Хост, который пропустит ALLOWED_HOSTS; при DEBUG пустой список разрешает localhost
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def percentile(values, percent):
+    # Ближайший ранг: p99 из 20 замеров — максимальный
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
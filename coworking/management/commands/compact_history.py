@@ -0,0 +1,121 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from coworking.models import Coworking, Workplace
+
+# Поля, которые меняются при каждом save() и не считаются изменением данных
+IGNORED_FIELDS = {'updated_at'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание таблиц истории коворкингов и мест: записи старше окна хранения '
+        'схлопываются (подряд идущие сохранения без изменений) и переносятся в помесячные архивные таблицы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=getattr(settings, 'HISTORY_KEEP_DAYS', 180),
+            help='Сколько последних дней истории не трогать'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей (объектов) за одну транзакцию')
+        parser.add_argument('--pause', type=float, default=0, help='Пауза между пачками, сек.')
+        parser.add_argument('--compact-only', action='store_true', help='Только схлопнуть, без переноса в архив')
+
+    def handle(self, *args, **options):
+        if options['keep_days'] < 0 or options['batch_size'] <= 0:
+            raise CommandError('--keep-days не может быть отрицательным, --batch-size должен быть больше 0')
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        cutoff = timezone.now() - timedelta(days=options['keep_days'])
+
+        for model in (Coworking, Workplace):
+            history = model.history.model
+            collapsed = self.compact(history, cutoff)
+            self.stdout.write(f'{history._meta.db_table}: схлопнуто записей без изменений — {collapsed}')
+            if not options['compact_only']:
+                archived = self.archive(history, cutoff)
+                self.stdout.write(f'{history._meta.db_table}: перенесено в архив — {archived}')
+
+    def batch_done(self):
+        if self.pause:
+            time.sleep(self.pause)
+
+    # -----------------------------
+    # Схлопывание
+    # -----------------------------
+
+    def compact(self, history, cutoff):
+        # Запись '~', у которой все поля совпадают с предыдущей записью того же объекта, лишняя
+        fields = [field.attname for field in history.tracked_fields if field.attname not in IGNORED_FIELDS]
+        old = history.objects.filter(history_date__lt=cutoff)
+        object_ids = list(old.filter(history_type='~').order_by('id').values_list('id', flat=True).distinct())
+
+        collapsed = 0
+        for start in range(0, len(object_ids), self.batch_size):
+            chunk = object_ids[start:start + self.batch_size]
+            with transaction.atomic():
+                rows = old.filter(id__in=chunk).order_by('id', 'history_date', 'history_id').values_list(
+                    'history_id', 'history_type', 'history_change_reason', *fields
+                )
+                redundant = []
+                previous = None
+                for history_id, history_type, reason, *values in rows:
+                    # values содержит id объекта, так что записи разных объектов не совпадут
+                    if history_type == '~' and not reason and values == previous:
+                        redundant.append(history_id)
+                    else:
+                        previous = values
+                history.objects.filter(history_id__in=redundant).delete()
+            collapsed += len(redundant)
+            self.batch_done()
+        return collapsed
+
+    # -----------------------------
+    # Архив
+    # -----------------------------
+
+    def archive(self, history, cutoff):
+        source = history._meta.db_table
+        columns = [field.column for field in history._meta.concrete_fields]
+        archived = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    history.objects.filter(history_date__lt=cutoff)
+                    .order_by('history_id')
+                    .values_list('history_id', 'history_date')[:self.batch_size]
+                )
+                if not batch:
+                    break
+                by_month = {}
+                for history_id, history_date in batch:
+                    month = timezone.localtime(history_date).strftime('%Y_%m')
+                    by_month.setdefault(month, []).append(history_id)
+                for month, ids in by_month.items():
+                    self.move(source, f'{source}_archive_{month}', columns, ids)
+            archived += len(batch)
+            self.batch_done()
+        return archived
+
+    def move(self, source, target, columns, ids):
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if target not in connection.introspection.table_names(cursor):
+                column_list = ', '.join(map(quote, columns))
+                cursor.execute(f'CREATE TABLE {quote(target)} AS SELECT {column_list} FROM {quote(source)} WHERE 1 = 0')
+                cursor.execute(f'CREATE INDEX {quote(target + "_id_date")} ON {quote(target)} (id, history_date)')
+            # Колонки, добавленные в историю уже после создания архива, в нём не сохраняются
+            existing = {column.name for column in connection.introspection.get_table_description(cursor, target)}
+            column_list = ', '.join(quote(column) for column in columns if column in existing)
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f'INSERT INTO {quote(target)} ({column_list}) SELECT {column_list} FROM {quote(source)} '
+                f'WHERE history_id IN ({placeholders})', ids
+            )
+            cursor.execute(f'DELETE FROM {quote(source)} WHERE history_id IN ({placeholders})', ids)
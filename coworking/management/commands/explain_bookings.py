@@ -0,0 +1,127 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from coworking.availability import conflicting_bookings, upcoming_bookings
+from coworking.models import Booking, BookingStatus, Coworking, Workplace, WorkplaceType
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = 'Проверяет через EXPLAIN, что горячие запросы к бронированиям идут по индексам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Сначала создать столько тестовых бронирований (например, 1000000)'
+        )
+        parser.add_argument('--workplaces', type=int, default=500, help='Рабочих мест для --seed')
+        parser.add_argument('--users', type=int, default=2000, help='Пользователей для --seed')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['workplaces'], options['users'])
+
+        workplace = Workplace.objects.order_by('?').first()
+        user = User.objects.filter(booking__isnull=False).order_by('?').first()
+        if workplace is None or user is None:
+            raise CommandError('В базе нет бронирований — запустите с --seed')
+
+        self.stdout.write(f'Бронирований в базе: {Booking.objects.count()}')
+
+        failed = []
+        for name, queryset in self.hot_queries(workplace, user):
+            plan = queryset.explain()
+            ok = uses_index(plan)
+            self.stdout.write(f'\n{name}\n{plan}')
+            if ok:
+                self.stdout.write(self.style.SUCCESS('OK: поиск по индексу'))
+            else:
+                self.stdout.write(self.style.ERROR('Полный просмотр таблицы'))
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f'Без индекса: {", ".join(failed)}')
+
+    def hot_queries(self, workplace, user):
+        now = timezone.now()
+        return [
+            (
+                'BookingForm.clean / booking_create: проверка пересечений',
+                conflicting_bookings(workplace, now, now + timedelta(hours=2)).values('id')[:1],
+            ),
+            (
+                'booking_create / booking_update: занятые часы',
+                upcoming_bookings(workplace).values_list('start_time', 'end_time'),
+            ),
+            (
+                'booking_list: брони пользователя',
+                Booking.objects.filter(user=user).order_by('-start_time'),
+            ),
+        ]
+
+    def seed(self, count, workplace_count, user_count):
+        coworking, _ = Coworking.objects.get_or_create(
+            name='Нагрузочный коворкинг',
+            defaults={'address': '-', 'description': 'Данные для проверки индексов'}
+        )
+        workplace_type, _ = WorkplaceType.objects.get_or_create(name='Стол')
+        status, _ = BookingStatus.objects.get_or_create(name='Активно')
+
+        existing = coworking.workplaces.count()
+        Workplace.objects.bulk_create([
+            Workplace(
+                name=f'Место {i}',
+                coworking=coworking,
+                workplace_type=workplace_type,
+                price_per_hour=100
+            )
+            for i in range(existing, workplace_count)
+        ])
+        workplace_ids = list(coworking.workplaces.values_list('id', flat=True)[:workplace_count])
+
+        User.objects.bulk_create(
+            [User(username=f'explain_user_{i}') for i in range(user_count)],
+            ignore_conflicts=True
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith='explain_user_').values_list('id', flat=True)
+        )
+
+        # Брони одного места идут подряд без пересечений, половина — в прошлом, половина — впереди
+        slots = count // len(workplace_ids) + 1
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=slots * 3 // 2)
+        created = 0
+        while created < count:
+            batch = []
+            for i in range(created, min(created + BATCH_SIZE, count)):
+                slot = i // len(workplace_ids)
+                start_time = start + timedelta(hours=slot * 3)
+                batch.append(Booking(
+                    user_id=random.choice(user_ids),
+                    workplace_id=workplace_ids[i % len(workplace_ids)],
+                    start_time=start_time,
+                    end_time=start_time + timedelta(hours=2),
+                    status=status,
+                    total_price=200
+                ))
+            Booking.objects.bulk_create(batch)
+            created += len(batch)
+            self.stdout.write(f'Создано бронирований: {created}/{count}')
+
+        # Свежая статистика, чтобы планировщик видел реальные размеры таблиц
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def uses_index(plan):
+    if connection.vendor == 'sqlite':
+        # SEARCH ... USING INDEX — поиск по индексу, SCAN coworking_booking — полный просмотр
+        lines = [line for line in plan.splitlines() if 'coworking_booking' in line]
+        return bool(lines) and all('SEARCH' in line and 'INDEX' in line for line in lines)
+    return 'Seq Scan on coworking_booking' not in plan and 'Index' in plan
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from coworking.exports import FORMATS, export_lines, export_rows
+
+
+def date_argument(value):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise CommandError(f'Ожидается дата в формате ГГГГ-ММ-ДД: {value}')
+    return day
+
+
+class Command(BaseCommand):
+    help = 'Выгружает бронирования с оплатами в CSV или NDJSON потоком, без загрузки всей выборки в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--date-from', type=date_argument, help='Начало периода (включительно)')
+        parser.add_argument('--date-to', type=date_argument, help='Конец периода (включительно)')
+        parser.add_argument('--coworking', type=int, help='id коворкинга')
+        parser.add_argument('--output', help='Файл для записи (по умолчанию — stdout)')
+
+    def handle(self, *args, **options):
+        rows = export_rows(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            coworking=options['coworking'],
+        )
+        lines = export_lines(options['format'], rows)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,70 @@
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coworking import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает профили запросов из PROFILE_DIR по view: сводка и самые затратные функции, '
+        'с --output — файл свёрнутых стеков на каждую view для flamegraph.pl / speedscope'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Каталог профилей (по умолчанию PROFILE_DIR)')
+        parser.add_argument('--view', help='Регулярное выражение: только подходящие view')
+        parser.add_argument('--output', help='Каталог для <view>.folded')
+        parser.add_argument('--top', type=int, default=5, help='Сколько функций показать на view')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir']) if options['dir'] else profiling.get_dir()
+        if not directory.is_dir():
+            raise CommandError(f'Каталог профилей {directory} не найден')
+        view_filter = options['view'] and re.compile(options['view'])
+
+        views = defaultdict(lambda: {'requests': 0, 'duration_ms': 0.0, 'stacks': Counter()})
+        for path in sorted(directory.glob(f'*{profiling.FILE_SUFFIX}')):
+            try:
+                meta, stacks = profiling.read(path)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f'Пропущен {path.name}: {e}')
+                continue
+            if view_filter and not view_filter.search(meta['view']):
+                continue
+            view = views[meta['view']]
+            view['requests'] += 1
+            view['duration_ms'] += meta['duration_ms']
+            view['stacks'].update(stacks)
+        if not views:
+            raise CommandError('Подходящих профилей нет')
+
+        output = options['output'] and Path(options['output'])
+        if output:
+            output.mkdir(parents=True, exist_ok=True)
+        # Самые медленные в сумме view — первыми
+        for name, view in sorted(views.items(), key=lambda item: -item[1]['duration_ms']):
+            samples = sum(view['stacks'].values())
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: запросов {view["requests"]}, в среднем {view["duration_ms"] / view["requests"]:.1f} мс, '
+                f'семплов {samples}'
+            ))
+            for frame, count in self_time(view['stacks']).most_common(options['top']):
+                self.stdout.write(f'  {count / samples:6.1%}  {frame}')
+            if output:
+                path = output / (re.sub(r'[^\w.-]', '-', name) + profiling.FILE_SUFFIX)
+                path.write_text(
+                    ''.join(f'{stack} {count}\n' for stack, count in sorted(view['stacks'].items())),
+                    encoding='utf-8'
+                )
+                self.stdout.write(f'  -> {path}')
+
+
+def self_time(stacks):
+    # Семплы, в которых функция была на вершине стека, — где время тратится непосредственно
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rpartition(';')[2]] += count
+    return leaves
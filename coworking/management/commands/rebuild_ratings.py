@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from coworking.ratings import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает среднюю оценку и число отзывов всех коворкингов по таблице отзывов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено коворкингов: {changed}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from coworking import revenue
+from coworking.management.commands.export_bookings import date_argument
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает выручку по дням (DailyRevenue) из платежей. '
+        'Без параметров — всю историю; сводка обновляется сигналами, команда нужна для сверки и восстановления'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date_argument, help='Пересчитать начиная с этой даты')
+        parser.add_argument('--date-to', type=date_argument, help='Пересчитать по эту дату (включительно)')
+
+    def handle(self, *args, **options):
+        rows = revenue.rebuild(options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f'Строк сводки: {rows}'))
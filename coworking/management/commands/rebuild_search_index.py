@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from coworking import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс поиска коворкингов и рабочих мест'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING('Полнотекстовый индекс не поддерживается этой СУБД'))
+            return
+
+        for model in search.SEARCH_FIELDS:
+            search.rebuild_index(model)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: проиндексировано {model.objects.count()}'
+            ))
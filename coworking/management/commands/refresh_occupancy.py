@@ -0,0 +1,23 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from coworking import analytics
+from coworking.management.commands.export_bookings import date_argument
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает дневную сводку загрузки рабочих мест (WorkplaceOccupancy). '
+        'Без параметров — только дни после последнего посчитанного, до вчерашнего включительно'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date_argument, help='Пересчитать начиная с этой даты')
+        parser.add_argument('--date-to', type=date_argument, help='Пересчитать по эту дату (включительно)')
+
+    def handle(self, *args, **options):
+        try:
+            days = analytics.refresh(options['date_from'], options['date_to'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Посчитано дней: {days}'))
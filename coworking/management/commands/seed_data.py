@@ -0,0 +1,257 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import DateTimeField, DecimalField, Max
+from django.utils import timezone
+
+from coworking import api_cache, ratings, search
+from coworking.models import (
+    Booking, BookingStatus, Coworking, DailyRevenue, Payment, PaymentStatus, Review, UserFavorite, Workplace, WorkplaceType
+)
+
+# Синтетическая сеть коворкингов для замеров (benchmark_urls, explain_bookings).
+# Всё пишется через bulk_create пачками по BATCH_SIZE в одной транзакции, без save() и сигналов:
+# поисковый индекс и рейтинги обновляются явно, выручка по дням считается по ходу, история не пишется.
+# Брони и платежи — самые большие таблицы — вставляются через executemany (RowWriter).
+# Брони одного места не пересекаются — период делится на равные отрезки, по брони в каждом.
+
+BATCH_SIZE = 5000
+# Брони создаются и на ближайшие дни вперёд — как у живого сервиса
+FUTURE_DAYS = 14
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Екатеринбург', 'Новосибирск', 'Нижний Новгород']
+STREETS = ['Тверская', 'Лесная', 'Садовая', 'Пушкина', 'Ленина', 'Мира', 'Невский проспект', 'Баумана']
+BRANDS = ['Точка', 'Рабочая среда', 'Офис на час', 'Лофт', 'Стартап-хаб', 'Открытое пространство']
+WORKPLACE_TYPES = ['Стол', 'Переговорная', 'Кабинет', 'Кресло в open space']
+PAYMENT_METHODS = ['карта', 'наличные', 'перевод']
+COMMENTS = [
+    'Тихо и удобно, хороший интернет.',
+    'Неплохо, но кондиционер шумит.',
+    'Отличное место для работы, вернусь ещё.',
+    'Дороговато для такого уровня.',
+    'Удобное расположение рядом с метро.',
+]
+# Оценки 1–5 с перекосом в сторону хороших, как в реальных отзывах
+RATING_WEIGHTS = [2, 3, 10, 35, 50]
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими коворкингами, местами, пользователями, бронями, платежами и отзывами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--coworkings', type=int, default=50)
+        parser.add_argument('--workplaces', type=int, default=20, help='Рабочих мест на коворкинг')
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=100000)
+        parser.add_argument('--paid', type=float, default=0.9, help='Доля прошедших броней с оплатой')
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=365, help='За сколько прошедших дней создавать брони')
+        parser.add_argument('--prefix', default='seed', help='Префикс имён пользователей')
+        parser.add_argument('--random-seed', type=int, default=0, help='Seed генератора — одинаковые данные от запуска к запуску')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('Нужна БД, которая возвращает id из bulk_create (SQLite 3.35+, PostgreSQL)')
+        if min(options['coworkings'], options['workplaces'], options['users'], options['days']) <= 0:
+            raise CommandError('--coworkings, --workplaces, --users и --days должны быть больше 0')
+        if User.objects.filter(username__startswith=f'{options["prefix"]}_').exists():
+            raise CommandError(f'Пользователи с префиксом «{options["prefix"]}» уже есть — укажите другой --prefix')
+
+        self.random = random.Random(options['random_seed'])
+        self.options = options
+        started = time.perf_counter()
+        with transaction.atomic():
+            coworkings = self.step('Коворкинги', self.create_coworkings)
+            workplaces = self.step('Рабочие места', lambda: self.create_workplaces(coworkings))
+            users = self.step('Пользователи', self.create_users)
+            self.step('Брони и платежи', lambda: self.create_bookings(workplaces, users))
+            self.step('Отзывы', lambda: self.create_reviews(coworkings, users))
+            self.step('Избранное', lambda: self.create_favorites(workplaces, users))
+            self.step('Рейтинги', ratings.rebuild)
+            transaction.on_commit(self.bump_cache)
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.perf_counter() - started:.1f} с'))
+
+    def step(self, label, func):
+        started = time.perf_counter()
+        result = func()
+        count = f': {len(result)}' if isinstance(result, list) else ''
+        self.stdout.write(f'{label}{count} — {time.perf_counter() - started:.1f} с')
+        return result
+
+    def create_coworkings(self):
+        coworkings = Coworking.objects.bulk_create([
+            Coworking(
+                name=f'{self.random.choice(BRANDS)} {i + 1}',
+                address=f'{self.random.choice(CITIES)}, ул. {self.random.choice(STREETS)}, {self.random.randint(1, 150)}',
+                description=' '.join(self.random.sample(COMMENTS, 3)),
+            )
+            for i in range(self.options['coworkings'])
+        ], batch_size=BATCH_SIZE)
+        search.index_objects(Coworking, coworkings)
+        return coworkings
+
+    def create_workplaces(self, coworkings):
+        types = [WorkplaceType.objects.get_or_create(name=name)[0] for name in WORKPLACE_TYPES]
+        workplaces = Workplace.objects.bulk_create([
+            Workplace(
+                name=f'Место {i + 1}',
+                coworking=coworking,
+                workplace_type=self.random.choice(types),
+                price_per_hour=Decimal(self.random.randrange(150, 1500, 50)),
+                is_active=self.random.random() > 0.05,
+            )
+            for coworking in coworkings
+            for i in range(self.options['workplaces'])
+        ], batch_size=BATCH_SIZE)
+        search.index_objects(Workplace, workplaces)
+        return workplaces
+
+    def create_users(self):
+        # Хеш пароля считается один раз: make_password на каждого занял бы минуты
+        password = make_password(self.options['prefix'])
+        prefix = self.options['prefix']
+        return User.objects.bulk_create([
+            User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password=password)
+            for i in range(self.options['users'])
+        ], batch_size=BATCH_SIZE)
+
+    def create_bookings(self, workplaces, users):
+        active, _ = BookingStatus.objects.get_or_create(name='Активно')
+        paid, _ = PaymentStatus.objects.get_or_create(name='Оплачен')
+        unpaid, _ = PaymentStatus.objects.get_or_create(name='не оплачен')
+        now = timezone.now()
+        first_day = timezone.localdate() - timedelta(days=self.options['days'])
+        period_start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+        period_hours = (self.options['days'] + FUTURE_DAYS) * 24
+
+        total = self.options['bookings']
+        per_workplace, extra = divmod(total, len(workplaces))
+        if per_workplace + bool(extra) > period_hours:
+            raise CommandError('Слишком много броней на место для такого периода — увеличьте --days')
+
+        bookings = RowWriter(
+            Booking, ['user', 'workplace', 'total_price', 'start_time', 'end_time', 'status', 'created_at', 'updated_at']
+        )
+        payments = RowWriter(Payment, ['booking', 'amount', 'payment_method', 'payment_date', 'status'])
+        # Выручка по дням копится здесь же: коворкинги новые, строк сводки для них ещё нет
+        daily = {}
+        user_ids = [user.pk for user in users]
+        local = timezone.get_current_timezone()
+        for index, workplace in enumerate(workplaces):
+            count = per_workplace + (1 if index < extra else 0)
+            slot = period_hours / count if count else 0
+            for i in range(count):
+                # Отрезок [begin, end) часов принадлежит одной брони
+                begin, end = int(i * slot), int((i + 1) * slot)
+                hours = self.random.randint(1, min(8, end - begin))
+                start = period_start + timedelta(hours=begin + self.random.randint(0, end - begin - hours))
+                price = workplace.price_per_hour * hours
+                booking_id = bookings.add(
+                    self.random.choice(user_ids), workplace.pk, price,
+                    start, start + timedelta(hours=hours), active.pk, now, now
+                )
+                if start >= now or self.random.random() >= self.options['paid']:
+                    continue
+                method = self.random.choice(PAYMENT_METHODS)
+                paid_at = start - timedelta(minutes=self.random.randint(5, 3 * 24 * 60))
+                status = paid if self.random.random() < 0.97 else unpaid
+                payments.add(booking_id, price, method, paid_at, status.pk)
+                key = (paid_at.astimezone(local).date(), workplace.coworking_id, method, status.pk)
+                amount, count_so_far = daily.get(key, (0, 0))
+                daily[key] = (amount + price, count_so_far + 1)
+        bookings.flush()
+        payments.flush()
+        reset_sequences(Booking, Payment)
+
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(
+                date=day, coworking_id=coworking_id, payment_method=method, status_id=status_id,
+                amount=amount, payments_count=count,
+            )
+            for (day, coworking_id, method, status_id), (amount, count) in daily.items()
+        ], batch_size=BATCH_SIZE)
+        self.stdout.write(f'Броней: {bookings.count}, платежей: {payments.count}, строк выручки: {len(daily)}')
+
+    def create_reviews(self, coworkings, users):
+        reviews = [
+            Review(
+                user=self.random.choice(users),
+                coworking=self.random.choice(coworkings),
+                rating=self.random.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+                comment=self.random.choice(COMMENTS),
+            )
+            for _ in range(self.options['reviews'])
+        ]
+        return Review.objects.bulk_create(reviews, batch_size=BATCH_SIZE)
+
+    def create_favorites(self, workplaces, users):
+        # Пара (пользователь, место) уникальна
+        wanted = min(self.options['favorites'], len(workplaces) * len(users))
+        pairs = set()
+        while len(pairs) < wanted:
+            pairs.add((self.random.randrange(len(users)), self.random.randrange(len(workplaces))))
+        return UserFavorite.objects.bulk_create([
+            UserFavorite(user=users[user], workplace=workplaces[workplace]) for user, workplace in sorted(pairs)
+        ], batch_size=BATCH_SIZE)
+
+    def bump_cache(self):
+        for model in (Coworking, Workplace):
+            api_cache.bump_version(model)
+
+
+class RowWriter:
+    # Вставка кортежей пачками через executemany с заранее выданными id.
+    # bulk_create на SQLite режет пачку по 999 параметров и готовит каждое значение
+    # через поле модели — на миллионах строк это минуты вместо секунд
+    def __init__(self, model, fields):
+        self.fields = [model._meta.get_field(name) for name in fields]
+        self.adapters = [adapter(field) for field in self.fields]
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in [model._meta.pk, *self.fields])
+        placeholders = ', '.join(['%s'] * (len(self.fields) + 1))
+        self.sql = f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+        self.next_id = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        self.rows = []
+        self.count = 0
+
+    def add(self, *values):
+        pk = self.next_id
+        self.next_id += 1
+        self.rows.append([pk, *(adapt(value) for adapt, value in zip(self.adapters, values))])
+        if len(self.rows) == BATCH_SIZE:
+            self.flush()
+        return pk
+
+    def flush(self):
+        if self.rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+
+def adapter(field):
+    # connection — прокси над thread-local, берём ops один раз, а не на каждое значение
+    ops = connection.ops
+    if isinstance(field, DateTimeField):
+        # Брони всех мест лежат на одной сетке часов — одни и те же значения приводятся один раз
+        return lru_cache(maxsize=100000)(ops.adapt_datetimefield_value)
+    if isinstance(field, DecimalField):
+        return lambda value: ops.adapt_decimalfield_value(value, field.max_digits, field.decimal_places)
+    return lambda value: value
+
+
+def reset_sequences(*models):
+    # id выдавали сами — счётчики автоинкремента (PostgreSQL) нужно подвинуть
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
@@ -0,0 +1,165 @@
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+# Метрики запросов: число SQL-запросов, время SQL и время ответа по каждой view.
+# Включаются настройкой REQUEST_METRICS (RequestMetricsMiddleware в middleware.py):
+#   - в ответ добавляется заголовок Server-Timing (видно во вкладке Network браузера);
+#   - значения копятся в гистограммах процесса и отдаются на /metrics в текстовом формате Prometheus.
+# Гистограммы живут в памяти процесса: при нескольких воркерах gunicorn каждый отдаёт свои,
+# Prometheus складывает их по меткам instance. Выключено — middleware не подключается вовсе.
+
+# Границы корзин: секунды для времени, штуки для числа запросов
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'REQUEST_METRICS', False)
+
+
+class QueryTimer:
+    # Считает запросы и их время на всех подключениях через execute_wrapper — штатную точку Django
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.stack = ExitStack()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+    def __enter__(self):
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.series = {}
+
+    def inc(self, labels):
+        with _lock:
+            self.series[labels] = self.series.get(labels, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with _lock:
+            for labels, value in sorted(self.series.items()):
+                lines.append(f'{self.name}{{{format_labels(labels)}}} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # метки -> [счётчики корзин..., сумма, количество]
+        self.series = {}
+
+    def observe(self, labels, value):
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * len(self.buckets) + [0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with _lock:
+            for labels, series in sorted(self.series.items()):
+                # Корзины в Prometheus накопительные: le=0.1 включает всё, что попало в le=0.05
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{format_labels(labels + (("le", bound),))}}} {count}')
+                lines.append(f'{self.name}_bucket{{{format_labels(labels + (("le", "+Inf"),))}}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{{format_labels(labels)}}} {series[-2]}')
+                lines.append(f'{self.name}_count{{{format_labels(labels)}}} {series[-1]}')
+        return lines
+
+
+REQUESTS = Counter('coworking_requests_total', 'Запросы по view, методу и коду ответа')
+REQUEST_DURATION = Histogram(
+    'coworking_request_duration_seconds', 'Время ответа view, секунды', DURATION_BUCKETS
+)
+SQL_DURATION = Histogram(
+    'coworking_request_sql_duration_seconds', 'Суммарное время SQL за запрос, секунды', DURATION_BUCKETS
+)
+QUERIES = Histogram('coworking_request_queries', 'Число SQL-запросов за запрос', QUERY_BUCKETS)
+# Обращения к кэшу ответов API (api_cache.py) — считаются всегда, даже без REQUEST_METRICS
+API_CACHE = Counter('coworking_api_cache_requests_total', 'Обращения к кэшу ответов API: hit или miss')
+METRICS = [REQUESTS, REQUEST_DURATION, SQL_DURATION, QUERIES, API_CACHE]
+
+
+def is_trusted(request):
+    # Служебный доступ: администратор, токен METRICS_TOKEN или адрес из METRICS_ALLOWED_IPS.
+    # Общий список INTERNAL_IPS не подходит: за nginx все клиенты приходят с 127.0.0.1
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+
+
+def view_name(request):
+    # Имя маршрута (coworking:booking_create, coworking_api:booking-list), а не путь —
+    # иначе у каждого id была бы своя серия
+    match = getattr(request, 'resolver_match', None)
+    return 'unresolved' if match is None else match.view_name
+
+
+def observe(request, response, duration, timer):
+    view = view_name(request)
+    labels = (('view', view), ('method', request.method))
+    REQUESTS.inc(labels + (('status', response.status_code),))
+    REQUEST_DURATION.observe(labels, duration)
+    SQL_DURATION.observe(labels, timer.duration)
+    QUERIES.observe(labels, timer.count)
+
+
+def server_timing(duration, timer):
+    # Значения заголовков — только latin-1, поэтому описание по-английски
+    return (
+        f'sql;desc="{timer.count} queries";dur={timer.duration * 1000:.1f}, '
+        f'total;dur={duration * 1000:.1f}'
+    )
+
+
+def render():
+    return '\n'.join(line for metric in METRICS for line in metric.render()) + '\n'
+
+
+def reset():
+    with _lock:
+        for metric in METRICS:
+            metric.series.clear()
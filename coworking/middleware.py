@@ -0,0 +1,78 @@
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, profiling, slow_queries
+from .history import deferred_history, get_mode
+
+
+def DeferredHistoryMiddleware(get_response):
+    # История изменений за запрос пишется одним bulk_create (HISTORY_DEFERRED в settings).
+    # Если режим выключен, middleware не подключается совсем
+    if not get_mode():
+        raise MiddlewareNotUsed
+
+    def middleware(request):
+        with deferred_history():
+            return get_response(request)
+
+    return middleware
+
+
+def RequestMetricsMiddleware(get_response):
+    # Число и время SQL-запросов и время ответа по view: заголовок Server-Timing и /metrics
+    # (REQUEST_METRICS в settings). Стоит первым, чтобы учитывать и остальные middleware.
+    # Гистограммы пишутся по всем запросам, а Server-Timing получают только те, кому открыт /metrics:
+    # число и время SQL посторонним не показываем.
+    # Если сбор выключен, middleware не подключается совсем
+    if not metrics.is_enabled():
+        raise MiddlewareNotUsed
+
+    def middleware(request):
+        started = time.perf_counter()
+        with metrics.QueryTimer() as timer:
+            response = get_response(request)
+        # Для потоковых ответов (выгрузка броней) — время до первого байта
+        duration = time.perf_counter() - started
+        metrics.observe(request, response, duration, timer)
+        # request.user к этому моменту уже выставлен AuthenticationMiddleware
+        if metrics.is_trusted(request):
+            response['Server-Timing'] = metrics.server_timing(duration, timer)
+        return response
+
+    return middleware
+
+
+def ProfilingMiddleware(get_response):
+    # Выборочное профилирование запросов в файлы свёрнутых стеков (PROFILE_* в settings, profiling.py).
+    # Стоит после AuthenticationMiddleware: заголовок PROFILE_HEADER действует только для администраторов.
+    # Если профилирование выключено, middleware не подключается совсем
+    if not profiling.is_enabled():
+        raise MiddlewareNotUsed
+    trigger = profiling.Trigger()
+
+    def middleware(request):
+        if not trigger.matches(request):
+            return get_response(request)
+        with profiling.StackSampler() as sampler:
+            response = get_response(request)
+        profiling.save(request, response, sampler)
+        return response
+
+    return middleware
+
+
+def SlowQueryLogMiddleware(get_response):
+    # Запоминает текущий запрос, чтобы журнал медленных SQL знал view (SLOW_QUERY_LOG в settings,
+    # slow_queries.py). Если журнал выключен, middleware не подключается совсем
+    if not slow_queries.is_enabled():
+        raise MiddlewareNotUsed
+
+    def middleware(request):
+        token = slow_queries.current_request.set(request)
+        try:
+            return get_response(request)
+        finally:
+            slow_queries.current_request.reset(token)
+
+    return middleware
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.17 on 2026-10-18 12:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0004_booking_total_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['workplace', 'end_time', 'start_time'], name='booking_workplace_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', '-start_time'], name='booking_user_start_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.17 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0005_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coworking',
+            index=models.Index(fields=['created_at', 'id'], name='coworking_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workplace',
+            index=models.Index(fields=['created_at', 'id'], name='workplace_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Полнотекстовый индекс для поиска в API (см. coworking/search.py).
+# Таблицы создаются только для SQLite (FTS5) и Postgres (tsvector + GIN).
+
+INDEXED = {
+    'coworking': ('coworking_coworking_fts', ('name', 'address', 'description')),
+    'workplace': ('coworking_workplace_fts', ('name',)),
+}
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+    for model_name, (table, fields) in INDEXED.items():
+        if vendor == 'sqlite':
+            schema_editor.execute(f'CREATE VIRTUAL TABLE {table} USING fts5({", ".join(fields)})')
+            schema_editor.execute(
+                f'INSERT INTO {table} (rowid, {", ".join(fields)}) '
+                f'SELECT id, {", ".join(fields)} FROM coworking_{model_name}'
+            )
+        else:
+            document = " || ' ' || ".join(f"coalesce({field}, '')" for field in fields)
+            schema_editor.execute(f'CREATE TABLE {table} (id bigint PRIMARY KEY, document tsvector NOT NULL)')
+            schema_editor.execute(f'CREATE INDEX {table}_document_idx ON {table} USING GIN (document)')
+            schema_editor.execute(
+                f"INSERT INTO {table} (id, document) "
+                f"SELECT id, to_tsvector('simple', {document}) FROM coworking_{model_name}"
+            )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    for table, _ in INDEXED.values():
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0006_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
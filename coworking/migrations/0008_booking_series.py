@@ -0,0 +1,40 @@
+# Generated by Django 4.2.17 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0007_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')], verbose_name='День недели')),
+                ('start_hour', models.PositiveSmallIntegerField(verbose_name='Час начала')),
+                ('end_hour', models.PositiveSmallIntegerField(verbose_name='Час окончания')),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1, verbose_name='Каждые N недель')),
+                ('start_date', models.DateField(verbose_name='Дата начала серии')),
+                ('end_date', models.DateField(verbose_name='Дата окончания серии')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('workplace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.workplace', verbose_name='Рабочее место')),
+            ],
+            options={
+                'verbose_name': 'Регулярное бронирование',
+                'verbose_name_plural': 'Регулярные бронирования',
+            },
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='coworking.bookingseries', verbose_name='Регулярное бронирование'),
+        ),
+    ]
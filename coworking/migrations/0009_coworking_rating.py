@@ -0,0 +1,37 @@
+# Generated by Django 4.2.17 on 2026-10-18 17:40
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def fill_ratings(apps, schema_editor):
+    Coworking = apps.get_model('coworking', 'Coworking')
+    Review = apps.get_model('coworking', 'Review')
+    stats = Review.objects.order_by().values('coworking').annotate(avg=Avg('rating'), count=Count('pk'))
+    for row in stats:
+        Coworking.objects.filter(pk=row['coworking']).update(rating_avg=row['avg'], rating_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0008_booking_series'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coworking',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False, verbose_name='Средняя оценка'),
+        ),
+        migrations.AddField(
+            model_name='coworking',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество отзывов'),
+        ),
+        migrations.AddIndex(
+            model_name='coworking',
+            index=models.Index(fields=['rating_avg', 'rating_count', 'id'], name='coworking_rating_idx'),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
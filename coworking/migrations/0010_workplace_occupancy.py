@@ -0,0 +1,29 @@
+# Generated by Django 4.2.17 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0009_coworking_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkplaceOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('busy_minutes', models.PositiveIntegerField(default=0, verbose_name='Занято минут')),
+                ('hourly', models.JSONField(default=list, verbose_name='Занятость по часам')),
+                ('workplace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='coworking.workplace', verbose_name='Рабочее место')),
+            ],
+            options={
+                'verbose_name': 'Загрузка рабочего места за день',
+                'verbose_name_plural': 'Загрузка рабочих мест по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'workplace'), name='workplace_occupancy_date_unique')],
+            },
+        ),
+    ]
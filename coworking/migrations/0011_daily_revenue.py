@@ -0,0 +1,52 @@
+# Generated by Django 4.2.17 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def fill_revenue(apps, schema_editor):
+    DailyRevenue = apps.get_model('coworking', 'DailyRevenue')
+    Payment = apps.get_model('coworking', 'Payment')
+    grouped = Payment.objects.annotate(
+        day=TruncDate('payment_date', tzinfo=timezone.get_current_timezone())
+    ).order_by().values(
+        'day', 'payment_method', 'status_id', coworking_id=F('booking__workplace__coworking_id')
+    ).annotate(total=Sum('amount'), count=Count('pk'))
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(
+            date=row['day'], coworking_id=row['coworking_id'], payment_method=row['payment_method'],
+            status_id=row['status_id'], amount=row['total'], payments_count=row['count'],
+        )
+        for row in grouped
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0010_workplace_occupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('payment_method', models.CharField(max_length=100, verbose_name='Способ оплаты')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма')),
+                ('payments_count', models.PositiveIntegerField(default=0, verbose_name='Платежей')),
+                ('coworking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue', to='coworking.coworking', verbose_name='Коворкинг')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.paymentstatus', verbose_name='Статус платежа')),
+            ],
+            options={
+                'verbose_name': 'Выручка за день',
+                'verbose_name_plural': 'Выручка по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'coworking', 'payment_method', 'status'), name='daily_revenue_unique')],
+            },
+        ),
+        migrations.RunPython(fill_revenue, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,11 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
-from simple_history.models import HistoricalRecords
+from django.utils import timezone
+
+from .history import DeferredHistoricalRecords
 
 # Пользователь и роли реализованы с помощью встроенных механизмов Django, поэтому отдельные модели не создавались, чтобы избежать дублирования.
 
@@ -8,6 +13,9 @@ class Coworking(models.Model):
     name = models.CharField('Название', max_length=255)
     address = models.CharField('Адрес', max_length=255)
     description = models.TextField('Описание')
+    # сводка по отзывам, поддерживается ratings.py
+    rating_avg = models.FloatField('Средняя оценка', default=0, editable=False)
+    rating_count = models.PositiveIntegerField('Количество отзывов', default=0, editable=False)
 
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата изменения', auto_now=True)
@@ -16,12 +24,36 @@ class Coworking(models.Model):
         # verbose_name чтобы интерфейс был понятен не разработчику, а администратору
         verbose_name = 'Коворкинг'
         verbose_name_plural = 'Коворкинги'
+        indexes = [
+            # постраничный вывод API по ключу (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='coworking_created_id_idx'),
+            # сортировка API по рейтингу (?ordering=-rating_avg): IndexedOrderingFilter в api_views.py
+            # дополняет ORDER BY остальными полями индекса
+            models.Index(fields=['rating_avg', 'rating_count', 'id'], name='coworking_rating_idx'),
+        ]
 
     # str определяет, как объект отображается в админке и в связях
     def __str__(self):
         return self.name
 
-    history = HistoricalRecords()
+    # рейтинг — производные данные, в истории изменений не нужен
+    history = DeferredHistoricalRecords(excluded_fields=['rating_avg', 'rating_count'])
+
+    RATING_FIELDS = ('rating_avg', 'rating_count')
+
+    # Рейтинг меняет только ratings.py (UPDATE с F()), обычный save() его не пишет: иначе
+    # сохранение формы или API вернуло бы значения, загруженные до нового отзыва
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs['update_fields'] = [name for name in update_fields if name not in self.RATING_FIELDS]
+        super().save(*args, **kwargs)
 
 
 class WorkplaceType(models.Model):
@@ -61,11 +93,17 @@ class Workplace(models.Model):
     class Meta:
         verbose_name = 'Рабочее место'
         verbose_name_plural = 'Рабочие места'
+        indexes = [models.Index(fields=['created_at', 'id'], name='workplace_created_id_idx')]
 
     def __str__(self):
         return f'{self.name} ({self.coworking.name})'
 
-    history = HistoricalRecords()
+    # Стоимость брони за интервал по почасовой цене
+    def price_for(self, start_time, end_time):
+        duration_hours = Decimal((end_time - start_time).total_seconds() / 3600)
+        return self.price_per_hour * duration_hours
+
+    history = DeferredHistoricalRecords()
 
 
 class BookingStatus(models.Model):
@@ -103,6 +141,15 @@ class Booking(models.Model):
         on_delete=models.PROTECT,
         verbose_name='Статус'
     )
+    series = models.ForeignKey(
+        'BookingSeries',
+        # Удаление серии не трогает уже созданные бронирования и их оплаты
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bookings',
+        verbose_name='Регулярное бронирование'
+    )
 
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата изменения', auto_now=True)
@@ -110,11 +157,68 @@ class Booking(models.Model):
     class Meta:
         verbose_name = 'Бронирование'
         verbose_name_plural = 'Бронирования'
+        indexes = [
+            # проверка пересечений и занятые часы: workplace = ? AND end_time > ? (AND start_time < ?)
+            models.Index(fields=['workplace', 'end_time', 'start_time'], name='booking_workplace_time_idx'),
+            # «Мои бронирования»: user = ? ORDER BY start_time DESC
+            models.Index(fields=['user', '-start_time'], name='booking_user_start_idx'),
+        ]
 
     def __str__(self):
         return f'Бронь #{self.id} — {self.workplace}'
 
 
+class BookingSeries(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Понедельник'),
+        (1, 'Вторник'),
+        (2, 'Среда'),
+        (3, 'Четверг'),
+        (4, 'Пятница'),
+        (5, 'Суббота'),
+        (6, 'Воскресенье'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    workplace = models.ForeignKey(
+        Workplace,
+        on_delete=models.CASCADE,
+        verbose_name='Рабочее место'
+    )
+    weekday = models.PositiveSmallIntegerField('День недели', choices=WEEKDAY_CHOICES)
+    start_hour = models.PositiveSmallIntegerField('Час начала')
+    end_hour = models.PositiveSmallIntegerField('Час окончания')
+    interval_weeks = models.PositiveSmallIntegerField('Каждые N недель', default=1)
+    start_date = models.DateField('Дата начала серии')
+    end_date = models.DateField('Дата окончания серии')
+
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Регулярное бронирование'
+        verbose_name_plural = 'Регулярные бронирования'
+
+    def __str__(self):
+        return f'{self.get_weekday_display()} {self.start_hour}:00–{self.end_hour}:00 — {self.workplace}'
+
+    # Даты серии с aware-временем начала и окончания, по возрастанию
+    def occurrences(self):
+        day = self.start_date + timedelta(days=(self.weekday - self.start_date.weekday()) % 7)
+        step = timedelta(weeks=self.interval_weeks)
+        while day <= self.end_date:
+            midnight = datetime.combine(day, datetime.min.time())
+            yield (
+                day,
+                timezone.make_aware(midnight + timedelta(hours=self.start_hour)),
+                timezone.make_aware(midnight + timedelta(hours=self.end_hour)),
+            )
+            day += step
+
+
 class PaymentStatus(models.Model):
     name = models.CharField('Статус платежа', max_length=100)
 
@@ -235,3 +339,58 @@ class UserFavorite(models.Model):
 
     def __str__(self):
         return f'{self.user.username} — {self.workplace.name}'
+
+
+class WorkplaceOccupancy(models.Model):
+    # Дневная сводка загрузки места, заполняется analytics.refresh (команда refresh_occupancy)
+    workplace = models.ForeignKey(
+        Workplace,
+        on_delete=models.CASCADE,
+        related_name='occupancy',
+        verbose_name='Рабочее место'
+    )
+    date = models.DateField('Дата')
+    busy_minutes = models.PositiveIntegerField('Занято минут', default=0)
+    # 24 числа: занятые минуты каждого часа суток
+    hourly = models.JSONField('Занятость по часам', default=list)
+
+    class Meta:
+        verbose_name = 'Загрузка рабочего места за день'
+        verbose_name_plural = 'Загрузка рабочих мест по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'workplace'], name='workplace_occupancy_date_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.workplace_id} — {self.date}'
+
+
+class DailyRevenue(models.Model):
+    # Сумма платежей за день по коворкингу, способу оплаты и статусу; поддерживается revenue.py
+    date = models.DateField('Дата')
+    coworking = models.ForeignKey(
+        Coworking,
+        on_delete=models.CASCADE,
+        related_name='revenue',
+        verbose_name='Коворкинг'
+    )
+    payment_method = models.CharField('Способ оплаты', max_length=100)
+    status = models.ForeignKey(
+        PaymentStatus,
+        on_delete=models.CASCADE,
+        verbose_name='Статус платежа'
+    )
+    amount = models.DecimalField('Сумма', max_digits=14, decimal_places=2, default=0)
+    payments_count = models.PositiveIntegerField('Платежей', default=0)
+
+    class Meta:
+        verbose_name = 'Выручка за день'
+        verbose_name_plural = 'Выручка по дням'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'coworking', 'payment_method', 'status'], name='daily_revenue_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.date} — {self.coworking_id} — {self.payment_method}'
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+from .metrics import is_trusted, view_name
+
+# Выборочное профилирование запросов на боевом сервере (ProfilingMiddleware в middleware.py).
+# Профилируется доля запросов PROFILE_SAMPLE_RATE, запросы к путям из PROFILE_PATHS
+# и запросы с заголовком PROFILE_HEADER от администраторов и служебных клиентов (metrics.is_trusted).
+# Профиль снимается семплированием: отдельный поток раз в PROFILE_INTERVAL запоминает стек
+# потока запроса. Каждый запрос пишется в PROFILE_DIR файлом со свёрнутыми стеками
+# («корень;...;лист число» — формат flamegraph.pl и speedscope), самые старые файлы
+# сверх PROFILE_MAX_FILES удаляются. manage.py profile_stacks собирает их по view.
+
+logger = logging.getLogger(__name__)
+
+FILE_SUFFIX = '.folded'
+
+
+def is_enabled():
+    return getattr(settings, 'PROFILE_REQUESTS', False)
+
+
+def get_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+class Trigger:
+    # Решает, профилировать ли запрос; настройки читаются один раз при создании middleware
+    def __init__(self):
+        self.rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        self.paths = [re.compile(pattern) for pattern in getattr(settings, 'PROFILE_PATHS', [])]
+        header = getattr(settings, 'PROFILE_HEADER', None)
+        self.header = header and 'HTTP_' + header.upper().replace('-', '_')
+
+    def matches(self, request):
+        # По заголовку — только для своих (как /metrics), иначе любой мог бы замедлить сервер
+        if self.header and request.META.get(self.header) and is_trusted(request):
+            return True
+        if any(pattern.search(request.path) for pattern in self.paths):
+            return True
+        return self.rate > 0 and random.random() < self.rate
+
+
+class StackSampler:
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'PROFILE_INTERVAL', 0.005)
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread_id = threading.get_ident()
+        self.stopped = threading.Event()
+        self.labels = {}
+
+    def __enter__(self):
+        # Стек обрезается по кадру, вошедшему в профилировщик, — WSGI-сервер выше него не интересен
+        self.root = sys._getframe(1)
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name='request-profiler', daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = self.collapse(frame) if frame is not None else None
+            if stack:
+                self.stacks[stack] += 1
+                self.samples += 1
+
+    def collapse(self, frame):
+        stack = []
+        while frame is not None and frame is not self.root:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        # Запрос уже закончен и ждёт остановки семплера — это не время запроса
+        if not stack or stack[-1] is StackSampler.__exit__.__code__:
+            return None
+        return ';'.join(self.label(code) for code in reversed(stack))
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f'{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})'
+        return label
+
+
+def short_path(filename):
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        return os.path.relpath(filename, base)
+    _, marker, rest = filename.rpartition('site-packages' + os.sep)
+    return rest if marker else os.path.basename(filename)
+
+
+def save(request, response, sampler):
+    # Ошибка записи профиля не должна ломать сам запрос
+    try:
+        directory = get_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'view': view_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(sampler.duration * 1000, 2),
+            'samples': sampler.samples,
+            'interval': sampler.interval,
+        }
+        # Имя начинается с времени — по нему же удаляем самые старые
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{uuid.uuid4().hex[:8]}{FILE_SUFFIX}'
+        lines = [f'{stack} {count}\n' for stack, count in sampler.stacks.most_common()]
+        with open(directory / name, 'w', encoding='utf-8') as f:
+            f.write(f'# {json.dumps(meta, ensure_ascii=False)}\n')
+            f.writelines(lines)
+        rotate(directory)
+    except OSError:
+        logger.exception('Не удалось сохранить профиль запроса %s', request.path)
+
+
+def rotate(directory):
+    limit = getattr(settings, 'PROFILE_MAX_FILES', 1000)
+    files = sorted(path for path in directory.iterdir() if path.name.endswith(FILE_SUFFIX))
+    for path in files[:max(0, len(files) - limit)]:
+        # Файл мог удалить параллельный воркер
+        path.unlink(missing_ok=True)
+
+
+def read(path):
+    # -> (метаданные, {стек: число семплов})
+    with open(path, encoding='utf-8') as f:
+        header = f.readline()
+        if not header.startswith('# '):
+            raise ValueError(f'{path}: нет строки с метаданными')
+        meta = json.loads(header[2:])
+        stacks = Counter()
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+    return meta, stacks
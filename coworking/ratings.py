@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models import Avg, Case, Count, ExpressionWrapper, F, FloatField, Value, When
+from django.utils import timezone
+
+from . import api_cache
+from .models import Coworking, Review
+
+# Средняя оценка и число отзывов хранятся в самом коворкинге (rating_avg, rating_count),
+# чтобы не агрегировать Review при каждом показе и сортировать API по индексу.
+# Добавление и удаление отзыва меняют их одним UPDATE по старым значениям строки
+# (вызывается из signals.py), команда rebuild_ratings пересчитывает всё с нуля.
+
+
+def apply(coworking_id, **values):
+    # updated_at меняем вместе с рейтингом: по нему считаются ETag страниц и ответов API
+    Coworking.objects.filter(pk=coworking_id).update(updated_at=timezone.now(), **values)
+    transaction.on_commit(lambda: api_cache.bump_version(Coworking))
+
+
+def review_added(review):
+    count = F('rating_count')
+    apply(
+        review.coworking_id,
+        rating_count=count + 1,
+        rating_avg=ExpressionWrapper(
+            (F('rating_avg') * count + review.rating) / (count + 1), output_field=FloatField()
+        ),
+    )
+
+
+def review_removed(review):
+    count = F('rating_count')
+    apply(
+        review.coworking_id,
+        rating_count=Case(When(rating_count__gt=0, then=count - 1), default=Value(0)),
+        rating_avg=Case(
+            When(rating_count__lte=1, then=Value(0.0)),
+            default=ExpressionWrapper(
+                (F('rating_avg') * count - review.rating) / (count - 1), output_field=FloatField()
+            ),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def recalculate(coworking_id):
+    # Для редкого изменения оценки существующего отзыва — честный пересчёт одного коворкинга
+    stats = Review.objects.filter(coworking_id=coworking_id).aggregate(avg=Avg('rating'), count=Count('pk'))
+    apply(coworking_id, rating_avg=stats['avg'] or 0.0, rating_count=stats['count'])
+
+
+def rebuild(batch_size=1000):
+    # Пересчёт всех коворкингов: один агрегирующий запрос, записываются только расхождения.
+    # Возвращает число исправленных строк
+    stats = {
+        row['coworking']: (float(row['avg']), row['count'])
+        for row in Review.objects.order_by().values('coworking').annotate(avg=Avg('rating'), count=Count('pk'))
+    }
+    now = timezone.now()
+    changed = []
+    for coworking in Coworking.objects.only('rating_avg', 'rating_count').iterator(chunk_size=batch_size):
+        avg, count = stats.get(coworking.pk, (0.0, 0))
+        if coworking.rating_count != count or abs(coworking.rating_avg - avg) > 1e-9:
+            coworking.rating_avg, coworking.rating_count, coworking.updated_at = avg, count, now
+            changed.append(coworking)
+    Coworking.objects.bulk_update(changed, ['rating_avg', 'rating_count', 'updated_at'], batch_size=batch_size)
+    if changed:
+        transaction.on_commit(lambda: api_cache.bump_version(Coworking))
+    return len(changed)
@@ -0,0 +1,192 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import ForeignKey
+from django.utils import timezone
+from import_export import fields, resources, widgets
+from import_export.instance_loaders import ModelInstanceLoader
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from . import api_cache, search
+from .models import Coworking, Workplace, WorkplaceType
+
+# Ресурсы django-import-export для админки.
+# Обычный режим сохраняет строки по одной (save() + сигналы + запись истории на строку).
+# Массовый режим для больших файлов:
+#   - существующие объекты и связанные записи загружаются заранее пачками по id,
+#     проверка строк идёт без запросов к БД;
+#   - запись через bulk_create / bulk_update пачками по BULK_BATCH_SIZE,
+#     история simple_history пишется такими же пачками;
+#   - поисковый индекс и версия кэша API обновляются явно — при bulk-операциях сигналы не срабатывают.
+
+BULK_BATCH_SIZE = 1000
+
+
+def chunks(values, size=BULK_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class ChunkedInstanceLoader(ModelInstanceLoader):
+    # Объекты, которые уже есть в БД, загружаются пачками по id до разбора строк
+    def __init__(self, resource, dataset=None):
+        super().__init__(resource, dataset)
+        self.pk_field = resource.fields[resource.get_import_id_fields()[0]]
+        ids = set()
+        if dataset is not None and self.pk_field.column_name in dataset.headers:
+            for row in dataset.dict:
+                try:
+                    ids.add(self.pk_field.clean(row))
+                except ValueError:
+                    # Некорректный id попадёт в ошибки строки при импорте
+                    continue
+        ids.discard(None)
+        self.instances = {}
+        for chunk in chunks(ids):
+            self.instances.update(self.get_queryset().in_bulk(chunk))
+
+    def get_instance(self, row):
+        return self.instances.get(self.pk_field.clean(row))
+
+
+class PrefetchedForeignKeyWidget(widgets.ForeignKeyWidget):
+    # Связанные объекты подгружаются пачками в before_import, при разборе строки — только поиск в словаре
+    def __init__(self, model, field='pk', **kwargs):
+        super().__init__(model, field, **kwargs)
+        self.cache = None
+
+    def model_field(self):
+        return self.model._meta.pk if self.field == 'pk' else self.model._meta.get_field(self.field)
+
+    def to_key(self, value):
+        # Из xlsx id приходят как 5.0, из csv — как '5'
+        return self.model_field().to_python(value)
+
+    def prefetch(self, values):
+        self.cache = {}
+        keys = set()
+        for value in values:
+            if value in (None, ''):
+                continue
+            try:
+                keys.add(self.to_key(value))
+            except ValidationError:
+                continue
+        for chunk in chunks(keys):
+            for obj in self.get_queryset(None, None).filter(**{f'{self.field}__in': chunk}):
+                self.cache[getattr(obj, self.field)] = obj
+
+    def get_instance_by_lookup_fields(self, value, row, **kwargs):
+        if self.cache is None:
+            return super().get_instance_by_lookup_fields(value, row, **kwargs)
+        try:
+            return self.cache[self.to_key(value)]
+        except (KeyError, ValidationError):
+            raise ValueError(f'{self.model._meta.verbose_name} «{value}» не найден')
+
+
+class BulkImportMixin:
+    # Подмешивается перед ModelResource: Meta задаёт пачки, хуки — историю, индекс и кэш
+
+    def before_import(self, dataset, **kwargs):
+        super().before_import(dataset, **kwargs)
+        # Пользователь из админки; без него simple_history берёт его из HistoryRequestMiddleware
+        self.history_user = kwargs.get('user')
+        self.changed = False
+        for field in self.fields.values():
+            if isinstance(field.widget, PrefetchedForeignKeyWidget) and field.column_name in dataset.headers:
+                field.widget.prefetch(dataset[field.column_name])
+
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        # Связи уже найдены среди заранее загруженных объектов, а уникальных полей у моделей нет:
+        # full_clean без проверок, которые делают запрос на каждую строку
+        errors = dict(import_validation_errors or {})
+        exclude = set(errors) | {
+            field.name for field in self._meta.model._meta.concrete_fields if isinstance(field, ForeignKey)
+        }
+        try:
+            instance.full_clean(exclude=exclude, validate_unique=False)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        if errors:
+            raise ValidationError(errors)
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        if self.create_instances and (using_transactions or not dry_run):
+            try:
+                created = bulk_create_with_history(
+                    self.create_instances, self._meta.model,
+                    batch_size=batch_size, default_user=self.history_user
+                )
+                search.index_objects(self._meta.model, created)
+                self.changed = True
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.create_instances.clear()
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        if self.update_instances and (using_transactions or not dry_run):
+            try:
+                # bulk_update не заполняет auto_now — от updated_at зависят ETag и версии страниц
+                now = timezone.now()
+                for instance in self.update_instances:
+                    instance.updated_at = now
+                bulk_update_with_history(
+                    self.update_instances, self._meta.model,
+                    [*self.get_bulk_update_fields(), 'updated_at'],
+                    batch_size=batch_size, default_user=self.history_user
+                )
+                search.index_objects(self._meta.model, self.update_instances)
+                self.changed = True
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.update_instances.clear()
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        if self.changed:
+            model = self._meta.model
+            transaction.on_commit(lambda: api_cache.bump_version(model))
+
+
+class CoworkingResource(resources.ModelResource):
+    class Meta:
+        model = Coworking
+        name = 'Обычный импорт'
+
+
+class CoworkingBulkResource(BulkImportMixin, resources.ModelResource):
+    class Meta:
+        model = Coworking
+        name = 'Массовый импорт'
+        fields = ('id', 'name', 'address', 'description')
+        use_bulk = True
+        batch_size = BULK_BATCH_SIZE
+        skip_diff = True
+        instance_loader_class = ChunkedInstanceLoader
+
+
+class WorkplaceResource(resources.ModelResource):
+    class Meta:
+        model = Workplace
+        name = 'Обычный импорт'
+
+
+class WorkplaceBulkResource(BulkImportMixin, resources.ModelResource):
+    coworking = fields.Field(
+        attribute='coworking', column_name='coworking', widget=PrefetchedForeignKeyWidget(Coworking)
+    )
+    workplace_type = fields.Field(
+        attribute='workplace_type', column_name='workplace_type', widget=PrefetchedForeignKeyWidget(WorkplaceType)
+    )
+
+    class Meta:
+        model = Workplace
+        name = 'Массовый импорт'
+        fields = ('id', 'name', 'coworking', 'workplace_type', 'price_per_hour', 'is_active')
+        use_bulk = True
+        batch_size = BULK_BATCH_SIZE
+        skip_diff = True
+        instance_loader_class = ChunkedInstanceLoader
@@ -0,0 +1,144 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .exports import local_midnight
+from .models import Booking, DailyRevenue, Payment
+
+# Выручка по дням в DailyRevenue: строка на (день, коворкинг, способ оплаты, статус платежа).
+# Создание, изменение и удаление платежа меняют одну-две строки приращением (signals.py),
+# отчёты за период читают только эти строки — O(дней), а не O(платежей).
+# rebuild_revenue заполняет таблицу с нуля или пересчитывает период.
+
+
+def local_date(value):
+    return timezone.localdate(value)
+
+
+def payment_entry(payment):
+    # (ключ строки сводки, сумма) для платежа в памяти
+    coworking_id = Booking.objects.filter(pk=payment.booking_id).values_list(
+        'workplace__coworking_id', flat=True
+    ).first()
+    key = {
+        'date': local_date(payment.payment_date),
+        'coworking_id': coworking_id,
+        'payment_method': payment.payment_method,
+        'status_id': payment.status_id,
+    }
+    return key, payment.amount
+
+
+def stored_entry(payment_id):
+    # То же по сохранённой в БД версии платежа (до изменения)
+    row = Payment.objects.filter(pk=payment_id).values(
+        'payment_date', 'payment_method', 'status_id', 'amount',
+        coworking_id=F('booking__workplace__coworking_id'),
+    ).first()
+    if row is None:
+        return None
+    key = {
+        'date': local_date(row['payment_date']),
+        'coworking_id': row['coworking_id'],
+        'payment_method': row['payment_method'],
+        'status_id': row['status_id'],
+    }
+    return key, row['amount']
+
+
+def add(key, amount, count=1):
+    if key['coworking_id'] is None:
+        return
+    changes = {'amount': F('amount') + amount, 'payments_count': F('payments_count') + count}
+    if DailyRevenue.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyRevenue.objects.create(**key, amount=amount, payments_count=count)
+    except IntegrityError:
+        # строку успел создать параллельный запрос
+        DailyRevenue.objects.filter(**key).update(**changes)
+
+
+def subtract(key, amount):
+    if key['coworking_id'] is None:
+        return
+    rows = DailyRevenue.objects.filter(**key)
+    rows.update(amount=F('amount') - amount, payments_count=F('payments_count') - 1)
+    rows.filter(payments_count=0).delete()
+
+
+def payment_saved(payment, created, before=None):
+    entry = payment_entry(payment)
+    if not created and before is not None:
+        if before == entry:
+            return
+        subtract(*before)
+    add(*entry)
+
+
+def payment_deleted(payment):
+    subtract(*payment_entry(payment))
+
+
+def rebuild(date_from=None, date_to=None):
+    # Пересчёт периода (по умолчанию — всей истории) одним GROUP BY по платежам.
+    # Возвращает число строк сводки
+    payments = Payment.objects.all()
+    rows = DailyRevenue.objects.all()
+    if date_from is not None:
+        payments = payments.filter(payment_date__gte=local_midnight(date_from))
+        rows = rows.filter(date__gte=date_from)
+    if date_to is not None:
+        payments = payments.filter(payment_date__lt=local_midnight(date_to + timedelta(days=1)))
+        rows = rows.filter(date__lte=date_to)
+
+    grouped = payments.annotate(
+        day=TruncDate('payment_date', tzinfo=timezone.get_current_timezone())
+    ).order_by().values(
+        'day', 'payment_method', 'status_id', coworking_id=F('booking__workplace__coworking_id')
+    ).annotate(total=Sum('amount'), count=Count('pk'))
+
+    with transaction.atomic():
+        rows.delete()
+        created = DailyRevenue.objects.bulk_create([
+            DailyRevenue(
+                date=row['day'],
+                coworking_id=row['coworking_id'],
+                payment_method=row['payment_method'],
+                status_id=row['status_id'],
+                amount=row['total'],
+                payments_count=row['count'],
+            )
+            for row in grouped.iterator(chunk_size=2000)
+        ], batch_size=2000)
+    return len(created)
+
+
+def money(value):
+    # SQLite возвращает сумму без копеек: Decimal('50') -> '50.00'
+    return str(Decimal(value or 0).quantize(Decimal('0.01')))
+
+
+def report(rows):
+    # Итоги и разбивки по строкам сводки; суммы — строками, как в сериализаторах
+    def group(field, key=None):
+        grouped = rows.order_by(field).values(field).annotate(total=Sum('amount'), count=Sum('payments_count'))
+        return [
+            {key or field: item[field], 'amount': money(item['total']), 'payments_count': item['count']}
+            for item in grouped
+        ]
+
+    totals = rows.aggregate(total=Sum('amount'), count=Sum('payments_count'))
+    return {
+        'amount': money(totals['total']),
+        'payments_count': totals['count'] or 0,
+        'by_day': group('date'),
+        'by_coworking': group('coworking'),
+        'by_method': group('payment_method'),
+        'by_status': group('status__name', 'status'),
+    }
@@ -0,0 +1,165 @@
+import re
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import Coworking, Workplace
+
+# Полнотекстовый индекс для поиска в API вместо LIKE '%...%' по всем строкам.
+# На каждую модель своя таблица, ключ строки = id объекта:
+#   SQLite   — виртуальная таблица FTS5, rank = bm25 (меньше — релевантнее);
+#   Postgres — таблица с tsvector и GIN-индексом, rank = -ts_rank.
+# Индекс обновляется сигналами post_save/post_delete (см. signals.py),
+# целиком пересобирается командой rebuild_search_index.
+
+SEARCH_FIELDS = {
+    Coworking: ('name', 'address', 'description'),
+    Workplace: ('name',),
+}
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def index_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def create_table_sql(vendor, model):
+    table = index_table(model)
+    if vendor == 'sqlite':
+        columns = ', '.join(SEARCH_FIELDS[model])
+        return [f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns})']
+    if vendor == 'postgresql':
+        return [
+            f'CREATE TABLE IF NOT EXISTS {table} (id bigint PRIMARY KEY, document tsvector NOT NULL)',
+            f'CREATE INDEX IF NOT EXISTS {table}_document_idx ON {table} USING GIN (document)',
+        ]
+    return []
+
+
+def drop_table_sql(vendor, model):
+    if vendor not in ('sqlite', 'postgresql'):
+        return []
+    return [f'DROP TABLE IF EXISTS {index_table(model)}']
+
+
+def document_values(model, instance):
+    return [getattr(instance, field) or '' for field in SEARCH_FIELDS[model]]
+
+
+def index_object(instance):
+    model = type(instance)
+    if model not in SEARCH_FIELDS or not is_supported():
+        return
+    table = index_table(model)
+    values = document_values(model, instance)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            columns = ', '.join(SEARCH_FIELDS[model])
+            placeholders = ', '.join(['%s'] * len(values))
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [instance.pk])
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {columns}) VALUES (%s, {placeholders})',
+                [instance.pk, *values]
+            )
+        else:
+            cursor.execute(
+                f'INSERT INTO {table} (id, document) VALUES (%s, to_tsvector(\'simple\', %s)) '
+                f'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document',
+                [instance.pk, ' '.join(values)]
+            )
+
+
+def index_objects(model, instances):
+    # То же для пачки объектов одного типа (массовый импорт): executemany вместо запроса на объект
+    if model not in SEARCH_FIELDS or not is_supported() or not instances:
+        return
+    table = index_table(model)
+    rows = [[instance.pk, *document_values(model, instance)] for instance in instances]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            columns = ', '.join(SEARCH_FIELDS[model])
+            placeholders = ', '.join(['%s'] * len(SEARCH_FIELDS[model]))
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [row[:1] for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, {columns}) VALUES (%s, {placeholders})', rows
+            )
+        else:
+            cursor.executemany(
+                f'INSERT INTO {table} (id, document) VALUES (%s, to_tsvector(\'simple\', %s)) '
+                f'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document',
+                [[row[0], ' '.join(row[1:])] for row in rows]
+            )
+
+
+def remove_object(instance):
+    model = type(instance)
+    if model not in SEARCH_FIELDS or not is_supported():
+        return
+    key = 'rowid' if connection.vendor == 'sqlite' else 'id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {index_table(model)} WHERE {key} = %s', [instance.pk])
+
+
+def rebuild_index(model, batch_size=2000):
+    # Одной транзакцией: пока идёт пересборка, поиск видит старый индекс, а сбой его не обрезает
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for sql in drop_table_sql(connection.vendor, model) + create_table_sql(connection.vendor, model):
+                cursor.execute(sql)
+        instances = model.objects.only(*SEARCH_FIELDS[model]).iterator(chunk_size=batch_size)
+        while batch := list(islice(instances, batch_size)):
+            index_objects(model, batch)
+
+
+def build_query(terms):
+    # Каждое слово ищем по префиксу, все слова обязательны; спецсимволы выбрасываем,
+    # чтобы пользовательский ввод не ломал синтаксис MATCH / to_tsquery
+    tokens = [token for term in terms for token in TOKEN_RE.findall(term)]
+    if not tokens:
+        return None
+    if connection.vendor == 'sqlite':
+        return ' '.join(f'"{token}"*' for token in tokens)
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def search(queryset, terms):
+    # Отбирает совпадения и добавляет search_rank (по возрастанию — от самых релевантных)
+    query = build_query(terms)
+    if query is None:
+        return queryset
+    model = queryset.model
+    table = index_table(model)
+    pk_column = f'{model._meta.db_table}.{model._meta.pk.column}'
+    if connection.vendor == 'sqlite':
+        matches = RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [query])
+        rank = RawSQL(
+            f'SELECT rank FROM {table} WHERE {table} MATCH %s AND rowid = {pk_column}', [query]
+        )
+    else:
+        matches = RawSQL(
+            f'SELECT id FROM {table} WHERE document @@ to_tsquery(\'simple\', %s)', [query]
+        )
+        rank = RawSQL(
+            f'SELECT -ts_rank(document, to_tsquery(\'simple\', %s)) FROM {table} WHERE id = {pk_column}',
+            [query]
+        )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('search_rank', 'pk')
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    # Тот же параметр ?search=, но через полнотекстовый индекс с сортировкой по релевантности.
+    # Для моделей без индекса и прочих СУБД — обычный SearchFilter (icontains)
+    def filter_queryset(self, request, queryset, view):
+        if queryset.model not in SEARCH_FIELDS or not is_supported():
+            return super().filter_queryset(request, queryset, view)
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search(queryset, terms)
@@ -1,5 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Coworking, Workplace
+from .models import Booking, BookingSeries, Coworking, Workplace
 
 class CoworkingSerializer(serializers.ModelSerializer):
     def validate_name(self, value):
@@ -36,3 +37,66 @@ class WorkplaceSerializer(serializers.ModelSerializer):
         model = Workplace
         # Перечисляет поля, которые будут включены в сериализацию
         fields = '__all__'
+
+
+class BookingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Booking
+        fields = ['id', 'workplace', 'start_time', 'end_time', 'total_price', 'status']
+        read_only_fields = fields
+
+
+class BookingItemSerializer(serializers.Serializer):
+    # id места проверяется во view одним запросом на всю пачку, а не запросом на элемент
+    workplace = serializers.IntegerField(min_value=1)
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError('Время окончания должно быть позже времени начала.')
+        if data['start_time'] < timezone.now():
+            raise serializers.ValidationError('Нельзя бронировать в прошлом.')
+        return data
+
+
+class BookingBatchSerializer(serializers.Serializer):
+    MAX_ITEMS = 200
+
+    bookings = BookingItemSerializer(many=True, allow_empty=False)
+
+    def validate_bookings(self, value):
+        if len(value) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f'Не больше {self.MAX_ITEMS} бронирований за запрос.')
+        return value
+
+
+class BookingSeriesSerializer(serializers.ModelSerializer):
+    # Не больше года вперёд: до 53 дат на серию
+    MAX_DAYS = 366
+
+    workplace = serializers.PrimaryKeyRelatedField(queryset=Workplace.objects.filter(is_active=True))
+    skip_conflicts = serializers.BooleanField(default=False, write_only=True)
+
+    class Meta:
+        model = BookingSeries
+        fields = [
+            'id', 'workplace', 'weekday', 'start_hour', 'end_hour',
+            'interval_weeks', 'start_date', 'end_date', 'skip_conflicts',
+        ]
+        extra_kwargs = {
+            'start_hour': {'min_value': 0, 'max_value': 23},
+            'end_hour': {'min_value': 1, 'max_value': 24},
+            'interval_weeks': {'min_value': 1, 'max_value': 52},
+        }
+
+    def validate(self, data):
+        if data['start_hour'] >= data['end_hour']:
+            raise serializers.ValidationError('Время окончания должно быть позже времени начала.')
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError('Дата окончания серии раньше даты начала.')
+        if data['start_date'] < timezone.localdate():
+            raise serializers.ValidationError('Нельзя бронировать в прошлом.')
+        if (data['end_date'] - data['start_date']).days > self.MAX_DAYS:
+            raise serializers.ValidationError(f'Серия не может быть длиннее {self.MAX_DAYS} дней.')
+        return data
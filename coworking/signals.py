@@ -0,0 +1,87 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import api_cache, ratings, revenue, search
+from .models import Coworking, Payment, Review, Workplace, WorkplaceType
+
+
+# Полнотекстовый индекс поиска
+@receiver(post_save, sender=Coworking)
+@receiver(post_save, sender=Workplace)
+def update_search_index(sender, instance, **kwargs):
+    search.index_object(instance)
+
+
+@receiver(post_delete, sender=Coworking)
+@receiver(post_delete, sender=Workplace)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_object(instance)
+
+
+# Версия кэша ответов API: любое изменение делает старые ответы недействительными.
+# Увеличиваем после коммита, иначе параллельный запрос успеет закэшировать
+# ещё не изменённые данные под новой версией
+@receiver(post_save, sender=Coworking)
+@receiver(post_save, sender=Workplace)
+@receiver(post_delete, sender=Coworking)
+@receiver(post_delete, sender=Workplace)
+def bump_api_cache_version(sender, **kwargs):
+    transaction.on_commit(lambda: api_cache.bump_version(sender))
+
+
+# Страница коворкинга показывает названия типов мест и имена авторов отзывов — их правка
+# меняет версию содержимого (conditional.coworking_content_version), как и правка самих мест
+@receiver(post_save, sender=WorkplaceType)
+@receiver(post_delete, sender=WorkplaceType)
+def bump_workplace_type_version(sender, **kwargs):
+    transaction.on_commit(lambda: api_cache.bump_version(WorkplaceType))
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Вход в систему сохраняет только last_login — тогда имя не сравниваем и лишний запрос не делаем
+    if raw or instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return
+    instance._username_before = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def bump_username_version(sender, instance, **kwargs):
+    if getattr(instance, '_username_before', instance.username) != instance.username:
+        transaction.on_commit(lambda: api_cache.bump_version(User))
+
+
+# Средняя оценка коворкинга: новый и удалённый отзыв — приращение, изменённый — пересчёт
+@receiver(post_save, sender=Review)
+def update_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        ratings.review_added(instance)
+    else:
+        ratings.recalculate(instance.coworking_id)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating(sender, instance, **kwargs):
+    ratings.review_removed(instance)
+
+
+# Выручка по дням: платёж меняет свою строку сводки, при изменении — старую и новую
+@receiver(pre_save, sender=Payment)
+def remember_revenue_entry(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk is not None:
+        instance._revenue_before = revenue.stored_entry(instance.pk)
+
+
+@receiver(post_save, sender=Payment)
+def update_revenue(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        revenue.payment_saved(instance, created, getattr(instance, '_revenue_before', None))
+
+
+@receiver(post_delete, sender=Payment)
+def remove_revenue(sender, instance, **kwargs):
+    revenue.payment_deleted(instance)
@@ -0,0 +1,215 @@
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+
+from .metrics import format_labels, view_name
+
+# Журнал медленных SQL-запросов (SLOW_QUERY_LOG в settings).
+# К каждому подключению добавляется execute_wrapper: запрос дольше SLOW_QUERY_THRESHOLD_MS
+# пишется в лог coworking.slow_queries вместе с нормализованным SQL (значения заменены на ?),
+# откуда он пришёл (view или команда manage.py, место в коде) и планом выполнения:
+# EXPLAIN QUERY PLAN на SQLite, EXPLAIN на остальных БД. План снимается один раз на вид запроса.
+# Одинаковые запросы схлопываются в счётчик: в лог попадают 1-й, 2-й, 4-й, 8-й... повтор.
+# Полный просмотр таблицы в плане отмечается отдельно — так ловятся запросы мимо индексов.
+# Управление транзакциями (BEGIN, SAVEPOINT s123_x1, RELEASE, ROLLBACK TO...) не учитывается:
+# у каждой точки сохранения своё имя, и такие «запросы» плодили бы новые виды без конца.
+# Счётчики процесса по видам запросов отдаются разделом /metrics (render()).
+
+logger = logging.getLogger(__name__)
+
+# Текущий HTTP-запрос (SlowQueryLogMiddleware): имя view берётся из него, когда SQL уже медленный
+current_request = contextvars.ContextVar('slow_query_request', default=None)
+
+NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s|\b\d+(?:\.\d+)?\b'), '?'),
+    # IN (?, ?, ?) разной длины — один и тот же запрос
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+TRANSACTION_RE = re.compile(r'^\s*(?:BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|START TRANSACTION)\b', re.IGNORECASE)
+# SQLite: «SCAN coworking_booking» без индекса; PostgreSQL: «Seq Scan on coworking_booking»
+FULL_SCAN_RE = re.compile(
+    r'\bSCAN (?:TABLE )?(?!(?:TABLE|CONSTANT|SUBQUERY)\b)(\w+)\b(?! USING (?:COVERING )?INDEX)|Seq Scan on (\w+)'
+)
+
+_lock = threading.Lock()
+_local = threading.local()
+stats = {}
+
+
+def is_enabled():
+    return getattr(settings, 'SLOW_QUERY_LOG', False)
+
+
+def install():
+    # Вызывается из CoworkingConfig.ready()
+    if not is_enabled():
+        return
+    connection_created.connect(attach)
+    for connection in connections.all(initialized_only=True):
+        attach(connection=connection)
+
+
+def attach(sender=None, connection=None, **kwargs):
+    if not any(isinstance(wrapper, SlowQueryLog) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLog(connection))
+
+
+def detach(connection):
+    connection.execute_wrappers[:] = [
+        wrapper for wrapper in connection.execute_wrappers if not isinstance(wrapper, SlowQueryLog)
+    ]
+
+
+class SlowQueryLog:
+    def __init__(self, connection):
+        self.connection = connection
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        # Упавший запрос не записываем: EXPLAIN после ошибки бессмыслен, а на PostgreSQL
+        # транзакция уже прервана
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        # Собственные EXPLAIN журнала и управление транзакциями не учитываем
+        if (duration >= self.threshold and not getattr(_local, 'explaining', False)
+                and not TRANSACTION_RE.match(sql)):
+            record(self.connection, sql, None if many else params, duration)
+        return result
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def get_origin():
+    request = current_request.get()
+    if request is not None:
+        return f'view {view_name(request)}'
+    if len(sys.argv) > 1 and os.path.basename(sys.argv[0]) == 'manage.py':
+        return f'manage.py {sys.argv[1]}'
+    return 'неизвестно'
+
+
+def get_location():
+    # Ближайший к запросу кадр из кода проекта (не Django и не этот модуль)
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and filename != __file__:
+            return f'{os.path.relpath(filename, base)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return None
+
+
+def explain(connection, sql, params):
+    if params is None or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    _local.explaining = True
+    try:
+        # Точка сохранения: на PostgreSQL ошибка EXPLAIN иначе сломала бы текущую транзакцию
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'EXPLAIN не выполнен: {e}'
+    finally:
+        _local.explaining = False
+    # SQLite: (id, parent, notused, detail); PostgreSQL и MySQL — строка плана в первой колонке
+    return '\n'.join(str(row[-1] if connection.vendor == 'sqlite' else row[0]) for row in rows)
+
+
+def full_scans(plan):
+    return sorted({first or second for first, second in FULL_SCAN_RE.findall(plan or '')})
+
+
+def record(connection, sql, params, duration):
+    fingerprint = normalize(sql)
+    query_origin = get_origin()
+    with _lock:
+        entry = stats.get(fingerprint)
+        first = entry is None
+        if first:
+            entry = stats[fingerprint] = {
+                'count': 0, 'total': 0.0, 'max': 0.0, 'origins': {}, 'plan': None, 'explained': False
+            }
+        entry['count'] += 1
+        entry['total'] += duration
+        entry['max'] = max(entry['max'], duration)
+        entry['origins'][query_origin] = entry['origins'].get(query_origin, 0) + 1
+        count = entry['count']
+
+    if first:
+        # EXPLAIN — запрос к БД, под блокировкой его не выполняем; план публикуем под ней
+        plan = explain(connection, sql, params)
+        with _lock:
+            entry['plan'] = plan
+            entry['explained'] = True
+    # Повторы пишем на степенях двойки: лог не растёт от одного и того же запроса в цикле
+    if count & (count - 1):
+        return
+    with _lock:
+        plan, explained, longest = entry['plan'], entry['explained'], entry['max']
+    if not explained:
+        # Первое выполнение в другом потоке ещё снимает план — он будет в его строке лога
+        plan = 'снимается'
+    scans = full_scans(plan)
+    logger.warning(
+        'Медленный запрос %.1f мс (выполнений: %s, макс. %.1f мс), источник: %s, место: %s%s\n%s\nПлан:\n%s',
+        duration * 1000, count, longest * 1000, query_origin, get_location() or '—',
+        f', ПОЛНЫЙ ПРОСМОТР: {", ".join(scans)}' if scans else '',
+        fingerprint, plan or '—',
+    )
+
+
+def report():
+    # -> [(нормализованный SQL, статистика)], самые затратные в сумме первыми
+    with _lock:
+        items = [(sql, dict(entry, origins=dict(entry['origins']))) for sql, entry in stats.items()]
+    return sorted(items, key=lambda item: -item[1]['total'])
+
+
+def render():
+    # Раздел /metrics: счётчики этого процесса по видам запросов. query — короткий хэш
+    # нормализованного SQL; текст запроса и таблицы с полным просмотром — в coworking_slow_query_info
+    counts = [
+        '# HELP coworking_slow_queries_total Медленные SQL-запросы по виду запроса и источнику',
+        '# TYPE coworking_slow_queries_total counter',
+    ]
+    seconds = [
+        '# HELP coworking_slow_query_seconds_total Суммарное время медленных SQL-запросов, секунды',
+        '# TYPE coworking_slow_query_seconds_total counter',
+    ]
+    info = [
+        '# HELP coworking_slow_query_info Нормализованный SQL и полные просмотры по хэшу запроса',
+        '# TYPE coworking_slow_query_info gauge',
+    ]
+    for sql, entry in report():
+        query = hashlib.sha1(sql.encode()).hexdigest()[:12]
+        for query_origin, count in sorted(entry['origins'].items()):
+            labels = (('query', query), ('origin', query_origin))
+            counts.append(f'coworking_slow_queries_total{{{format_labels(labels)}}} {count}')
+        seconds.append(f'coworking_slow_query_seconds_total{{query="{query}"}} {entry["total"]}')
+        labels = (('query', query), ('sql', sql[:1000]), ('full_scan', ','.join(full_scans(entry['plan']))))
+        info.append(f'coworking_slow_query_info{{{format_labels(labels)}}} 1')
+    return '\n'.join(counts + seconds + info) + '\n'
+
+
+def reset():
+    with _lock:
+        stats.clear()
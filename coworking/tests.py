@@ -1,3 +1,1040 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+import tablib
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from simple_history.signals import post_create_historical_record, pre_create_historical_record
+
+from . import api_cache, metrics, profiling, search, slow_queries
+from .fast_serializers import get_values_serializer
+from .history import deferred_history, wait_for_history
+from .resources import WorkplaceBulkResource
+from .serializers import CoworkingSerializer, WorkplaceSerializer
+from .models import (
+    Booking, BookingSeries, BookingStatus, Coworking, CoworkingImage, DailyRevenue, Payment, PaymentStatus, Review,
+    UserFavorite, Workplace, WorkplaceOccupancy, WorkplaceType
+)
+
+
+def make_workplaces(count, coworking=None):
+    coworking = coworking or Coworking.objects.create(name='Центр', address='Адрес', description='Описание')
+    workplace_type, _ = WorkplaceType.objects.get_or_create(name='Стол')
+    return [
+        Workplace.objects.create(
+            name=f'Место {i}',
+            coworking=coworking,
+            workplace_type=workplace_type,
+            price_per_hour=100
+        )
+        for i in range(count)
+    ]
+
+
+class WorkplaceAvailableTests(TestCase):
+    def setUp(self):
+        self.workplaces = make_workplaces(2)
+        start = timezone.make_aware(datetime(2025, 1, 10, 10))
+        Booking.objects.create(
+            user=User.objects.create(username='user'), workplace=self.workplaces[0],
+            status=BookingStatus.objects.create(name='Активно'),
+            start_time=start, end_time=start + timedelta(hours=2)
+        )
+
+    def available(self, start, end):
+        return self.client.get(reverse('coworking_api:workplace-available'), {'start': start, 'end': end})
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()}
+
+    def test_conflicting_booking_excludes_workplace(self):
+        self.assertEqual(self.ids(self.available('2025-01-10T11:00', '2025-01-10T13:00')), {self.workplaces[1].pk})
+        # Бронь до 12:00 с интервалом с 12:00 не пересекается
+        self.assertEqual(
+            self.ids(self.available('2025-01-10T12:00', '2025-01-10T13:00')), {wp.pk for wp in self.workplaces}
+        )
+
+    def test_invalid_range(self):
+        for start, end in [
+            ('2025-02-30T10:00', '2025-03-01T10:00'),
+            ('вчера', '2025-01-10T13:00'),
+            ('2025-01-10T13:00', '2025-01-10T11:00'),
+            ('', '2025-01-10T11:00'),
+        ]:
+            with self.subTest(start=start, end=end):
+                self.assertEqual(self.available(start, end).status_code, 400)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    threads = 8
+
+    def setUp(self):
+        BookingStatus.objects.create(name='Активно')
+        self.users = [User.objects.create(username=f'user{i}') for i in range(self.threads)]
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.post_data = {
+            'date_start': tomorrow,
+            'date_end': tomorrow,
+            'start_hour': 10,
+            'end_hour': 12,
+        }
+
+    def book_concurrently(self, workplaces):
+        barrier = threading.Barrier(len(self.users))
+        errors = []
+
+        def worker(user, workplace):
+            client = Client()
+            client.force_login(user)
+            try:
+                barrier.wait()
+                client.post(reverse('coworking:booking_create', args=[workplace.id]), self.post_data)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(user, workplace))
+            for user, workplace in zip(self.users, workplaces)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_one_workplace_is_booked_once(self):
+        workplace = make_workplaces(1)[0]
+        self.book_concurrently([workplace] * self.threads)
+        self.assertEqual(Booking.objects.filter(workplace=workplace).count(), 1)
+
+    def test_different_workplaces_are_all_booked(self):
+        workplaces = make_workplaces(self.threads)
+        self.book_concurrently(workplaces)
+        self.assertEqual(Booking.objects.count(), self.threads)
+
+
+class BookingIndexTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        # Команда падает с CommandError, если хоть один запрос идёт полным просмотром
+        call_command('explain_bookings', seed=2000, workplaces=20, users=10, stdout=StringIO())
+
+
+class CoworkingListQueryTests(TestCase):
+    def add_coworkings(self, count):
+        for i in range(count):
+            coworking = Coworking.objects.create(name=f'Коворкинг {i}', address='Адрес', description='Описание')
+            CoworkingImage.objects.create(coworking=coworking)
+            CoworkingImage.objects.create(coworking=coworking, image=f'coworkings/{i}.jpg')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('coworking:coworking_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow(self):
+        self.add_coworkings(2)
+        few, response = self.count_queries()
+        self.assertContains(response, '/media/coworkings/1.jpg')
+
+        self.add_coworkings(20)
+        many, _ = self.count_queries()
+        self.assertEqual(few, many)
+
+
+class BookingListQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.client.force_login(self.user)
+        self.workplaces = make_workplaces(3)
+        self.status = BookingStatus.objects.create(name='Активно')
+        self.paid = PaymentStatus.objects.create(name='Оплачен')
+
+    def add_bookings(self, count):
+        now = timezone.now()
+        for i in range(count):
+            # половина броней в прошлом, половина впереди, часть оплачена
+            start = now + timedelta(days=i - count // 2)
+            booking = Booking.objects.create(
+                user=self.user,
+                workplace=self.workplaces[i % len(self.workplaces)],
+                start_time=start,
+                end_time=start + timedelta(hours=1),
+                status=self.status
+            )
+            if i % 2:
+                Payment.objects.create(
+                    booking=booking, amount=100, payment_method='карта',
+                    payment_date=now, status=self.paid
+                )
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('coworking:booking_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow(self):
+        self.add_bookings(4)
+        few = self.count_queries()
+        self.add_bookings(40)
+        self.assertEqual(few, self.count_queries())
+
+    def test_past_bookings_are_paginated(self):
+        self.add_bookings(60)
+        response = self.client.get(reverse('coworking:booking_list'), {'page': 2})
+        self.assertEqual(response.context['past_page'].number, 2)
+        self.assertEqual(len(response.context['past_page'].object_list), 10)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_walks_all_workplaces_without_count(self):
+        workplaces = make_workplaces(12)
+        url = reverse('coworking_api:workplace-list') + '?cursor=&page_size=5'
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                data = self.client.get(url).json()
+                seen += [row['id'] for row in data['results']]
+                url = data['next']
+        self.assertEqual(seen, [workplace.id for workplace in workplaces])
+        # COUNT(*) допустим только по окну страницы (для ETag), не по всей таблице
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] and 'LIMIT' not in q['sql']])
+
+    def test_page_number_is_default(self):
+        make_workplaces(6)
+        data = self.client.get(reverse('coworking_api:workplace-list')).json()
+        self.assertEqual(data['count'], 6)
+        self.assertIsNotNone(data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('coworking_api:workplace-list'), {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_rejects_ordering_and_search(self):
+        url = reverse('coworking_api:coworking-list')
+        for params in ({'cursor': '', 'ordering': '-rating_avg'}, {'cursor': '', 'search': 'Центр'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(name for name in params if name != 'cursor'), response.json())
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def search(self, text):
+        response = self.client.get(reverse('coworking_api:coworking-list'), {'search': text})
+        return [row['name'] for row in response.json()['results']]
+
+    def test_search_follows_saves_and_deletes(self):
+        center = Coworking.objects.create(name='Центр', address='Тверская, 1', description='Рядом с метро')
+        Coworking.objects.create(name='Окраина', address='Лесная, 5', description='Тихий коворкинг у центрального парка')
+
+        # совпадение в названии релевантнее, чем в длинном описании
+        self.assertEqual(self.search('центр'), ['Центр', 'Окраина'])
+        self.assertEqual(self.search('тверская метро'), ['Центр'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            center.name = 'Запад'
+            center.save()
+        self.assertEqual(self.search('запад'), ['Запад'])
+        with self.captureOnCommitCallbacks(execute=True):
+            center.delete()
+        self.assertEqual(self.search('запад'), [])
+
+    def test_special_characters_are_ignored(self):
+        Coworking.objects.create(name='Центр', address='Адрес', description='Описание')
+        self.assertEqual(self.search('"центр*:('), ['Центр'])
+
+
+class ApiCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.workplace = make_workplaces(1)[0]
+        self.url = reverse('coworking_api:workplace-list')
+
+    def get_names(self):
+        return [row['name'] for row in self.client.get(self.url).json()['results']]
+
+    def test_second_request_is_served_from_cache(self):
+        self.get_names()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_names(), ['Место 0'])
+        # остаётся только агрегат для ETag, без выборки и сериализации
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(api_cache.get_stats(), {'hit': 1, 'miss': 1})
+
+    def test_deploy_check_requires_shared_cache(self):
+        for backend, errors in [
+            ('django.core.cache.backends.locmem.LocMemCache', ['coworking.E001']),
+            ('django.core.cache.backends.db.DatabaseCache', ['coworking.E001']),
+            ('django.core.cache.backends.memcached.PyMemcacheCache', []),
+        ]:
+            with self.subTest(backend=backend), override_settings(CACHES={'default': {'BACKEND': backend}}):
+                self.assertEqual([error.id for error in api_cache.check_shared_cache(None)], errors)
+
+    def test_save_invalidates_cache(self):
+        self.get_names()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.workplace.name = 'Переговорная'
+            self.workplace.save()
+        self.assertEqual(self.get_names(), ['Переговорная'])
+
+    def test_deactivate_invalidates_cache(self):
+        active_url = reverse('coworking_api:workplace-smart-filter')
+        self.assertEqual(len(self.client.get(active_url).json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('coworking_api:workplace-deactivate', args=[self.workplace.id]))
+        self.assertEqual(self.client.get(active_url).json(), [])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.workplace = make_workplaces(1)[0]
+
+    def assert_not_modified_until_change(self, url, change):
+        response = self.client.get(url)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertLessEqual(len(queries), 1)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def rename(self):
+        self.workplace.name = 'Переговорная'
+        self.workplace.save()
+
+    def test_api_list(self):
+        self.assert_not_modified_until_change(reverse('coworking_api:workplace-list'), self.rename)
+
+    def test_api_list_sees_deletes(self):
+        make_workplaces(1, coworking=self.workplace.coworking)
+        self.assert_not_modified_until_change(reverse('coworking_api:workplace-list'), self.workplace.delete)
+
+    def test_api_action_ignores_list_filters(self):
+        # smart_filter не применяет ?search=, значит и ETag должен учитывать все его строки
+        hall = make_workplaces(1, coworking=self.workplace.coworking)[0]
+        hall.name = 'Зал'
+        hall.save()
+
+        def reprice_hall():
+            hall.price_per_hour = 200
+            hall.save()
+
+        url = reverse('coworking_api:workplace-smart-filter') + '?search=Место'
+        self.assert_not_modified_until_change(url, reprice_hall)
+
+    def test_api_retrieve(self):
+        url = reverse('coworking_api:workplace-detail', args=[self.workplace.id])
+        self.assert_not_modified_until_change(url, self.rename)
+        self.assertIn('Last-Modified', self.client.get(url))
+
+    def test_coworking_detail(self):
+        url = reverse('coworking:coworking_detail', args=[self.workplace.coworking_id])
+        self.assert_not_modified_until_change(url, self.rename)
+
+    def test_workplace_detail_depends_on_user(self):
+        url = reverse('coworking:workplace_detail', args=[self.workplace.id])
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(User.objects.create(username='user'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CoworkingDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.workplaces = make_workplaces(3)
+        self.coworking = self.workplaces[0].coworking
+        self.url = reverse('coworking:coworking_detail', args=[self.coworking.id])
+        self.user = User.objects.create(username='user')
+        Review.objects.create(user=self.user, coworking=self.coworking, rating=5, comment='Отлично')
+
+    def test_shared_fragments_come_from_cache(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Отлично')
+        self.assertContains(response, 'Место 2')
+        # версия коворкинга и сам коворкинг; места, фото и отзывы — из кэша
+        self.assertEqual(len(queries), 2)
+
+    def test_hearts_are_per_user(self):
+        self.client.get(self.url)
+        UserFavorite.objects.create(user=self.user, workplace=self.workplaces[1])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).content.decode().count('❤️'), 1)
+        self.client.force_login(User.objects.create(username='other'))
+        self.assertNotContains(self.client.get(self.url), '❤️')
+
+    def test_new_review_is_shown(self):
+        self.client.get(self.url)
+        Review.objects.create(user=self.user, coworking=self.coworking, rating=4, comment='Неплохо')
+        self.assertContains(self.client.get(self.url), 'Неплохо')
+
+    def test_renamed_type_and_author_are_shown(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkplaceType.objects.update_or_create(name='Стол', defaults={'name': 'Кресло'})
+            self.user.username = 'renamed'
+            self.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Кресло')
+        self.assertContains(response, 'renamed')
+
+
+class ValuesSerializerTests(TestCase):
+    def assert_same_json(self, serializer_class, queryset):
+        fast = get_values_serializer(serializer_class)
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(fast.to_representation(queryset.values(*fast.columns))),
+            renderer.render(serializer_class(queryset, many=True).data)
+        )
+
+    def test_output_is_byte_identical(self):
+        workplaces = make_workplaces(3)
+        workplaces[1].price_per_hour = '1234.5'
+        workplaces[1].is_active = False
+        workplaces[1].save()
+        for tz in ('Europe/Moscow', 'UTC'):
+            with timezone.override(tz):
+                self.assert_same_json(CoworkingSerializer, Coworking.objects.order_by('pk'))
+                self.assert_same_json(WorkplaceSerializer, Workplace.objects.order_by('pk'))
+
+    def test_benchmark_command(self):
+        call_command('benchmark_serializers', rows=[5], repeat=1, stdout=StringIO())
+
+
+class BookingBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.client.force_login(self.user)
+        self.workplaces = make_workplaces(3)
+        self.url = reverse('coworking_api:booking-batch')
+        self.start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def item(self, workplace, hour, hours=1):
+        start = self.start + timedelta(hours=hour)
+        return {
+            'workplace': workplace.id,
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=hours)).isoformat(),
+        }
+
+    def post(self, items):
+        return self.client.post(self.url, {'bookings': items}, content_type='application/json')
+
+    def test_creates_all_with_constant_queries(self):
+        items = [self.item(workplace, hour) for workplace in self.workplaces for hour in range(0, 20, 2)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 30)
+        self.assertEqual(response.json()[0]['total_price'], '100.00')
+        self.assertLess(len(queries), 15)
+
+    def test_overlap_inside_request_rejects_everything(self):
+        response = self.post([
+            self.item(self.workplaces[0], 0, hours=3),
+            self.item(self.workplaces[1], 1),
+            self.item(self.workplaces[0], 2),
+        ])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([c['index'] for c in response.json()['conflicts']], [0, 2])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_overlap_with_existing_booking(self):
+        self.assertEqual(self.post([self.item(self.workplaces[0], 5, hours=2)]).status_code, 201)
+        response = self.post([self.item(self.workplaces[1], 5), self.item(self.workplaces[0], 6)])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['conflicts'][0]['index'], 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.post([self.item(self.workplaces[0], 0)]).status_code, 403)
+
+
+class RecurringBookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.client.force_login(self.user)
+        self.workplace = make_workplaces(1)[0]
+        self.url = reverse('coworking_api:booking-recurring')
+        self.start_date = timezone.localdate() + timedelta(days=1)
+
+    def post(self, **extra):
+        data = {
+            'workplace': self.workplace.id,
+            'weekday': self.start_date.weekday(),
+            'start_hour': 10,
+            'end_hour': 14,
+            'start_date': self.start_date.isoformat(),
+            'end_date': (self.start_date + timedelta(weeks=25)).isoformat(),
+            **extra,
+        }
+        return self.client.post(self.url, data, content_type='application/json')
+
+    def book(self, day, start_hour, end_hour):
+        midnight = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        Booking.objects.create(
+            user=self.user, workplace=self.workplace,
+            start_time=midnight + timedelta(hours=start_hour),
+            end_time=midnight + timedelta(hours=end_hour),
+            status=BookingStatus.objects.get_or_create(name='Активно')[0], total_price=100
+        )
+
+    def test_creates_weekly_occurrences_with_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['bookings']), 26)
+        self.assertEqual(Booking.objects.filter(series__isnull=False).count(), 26)
+        self.assertEqual(response.json()['bookings'][0]['total_price'], '400.00')
+        self.assertLess(len(queries), 15)
+
+    def test_deleting_series_keeps_bookings(self):
+        self.post()
+        BookingSeries.objects.get().delete()
+        self.assertEqual(Booking.objects.filter(series__isnull=True).count(), 26)
+
+    def test_reports_conflicting_dates(self):
+        busy = [self.start_date + timedelta(weeks=3), self.start_date + timedelta(weeks=10)]
+        self.book(busy[0], 13, 15)
+        self.book(busy[1], 9, 11)
+        self.book(busy[1] + timedelta(days=1), 10, 14)
+
+        response = self.post()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['conflicts'], [day.isoformat() for day in busy])
+        self.assertEqual(Booking.objects.count(), 3)
+
+        response = self.post(skip_conflicts=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['bookings']), 24)
+        self.assertEqual(response.json()['skipped'], [day.isoformat() for day in busy])
+
+
+class BookingExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.client.force_login(self.admin)
+        booking_status = BookingStatus.objects.create(name='Активно')
+        self.workplaces = make_workplaces(1) + make_workplaces(1)
+        start = timezone.make_aware(datetime(2026, 3, 10, 10))
+        self.bookings = [
+            Booking.objects.create(
+                user=self.admin, workplace=workplace, start_time=start + timedelta(days=day),
+                end_time=start + timedelta(days=day, hours=2), status=booking_status, total_price=200
+            )
+            for workplace in self.workplaces for day in range(3)
+        ]
+        Payment.objects.create(
+            booking=self.bookings[0], amount=200, payment_method='карта',
+            payment_date=start, status=PaymentStatus.objects.create(name='Оплачен')
+        )
+        self.url = reverse('coworking:booking_export')
+
+    def test_csv_filters_by_coworking_and_dates(self):
+        coworking = self.workplaces[0].coworking_id
+        response = self.client.get(self.url, {
+            'coworking': coworking, 'date_from': '2026-03-11', 'date_to': '2026-03-12',
+        })
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([int(row['booking_id']) for row in rows], [b.id for b in self.bookings[1:3]])
+        self.assertEqual(rows[0]['payment_amount'], '')
+
+        response = self.client.get(self.url, {'coworking': coworking})
+        first = next(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual((first['payment_amount'], first['payment_status']), ('200.00', 'Оплачен'))
+        self.assertEqual(first['start_time'], '2026-03-10T10:00:00+03:00')
+
+    def test_command_writes_ndjson(self):
+        output = StringIO()
+        call_command('export_bookings', '--format', 'ndjson', stdout=output)
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['payment_method'], 'карта')
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create(username='user'))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.existing = make_workplaces(1)[0]
+
+    def dataset(self, rows):
+        dataset = tablib.Dataset(headers=['id', 'name', 'coworking', 'workplace_type', 'price_per_hour', 'is_active'])
+        for row in rows:
+            dataset.append(row)
+        return dataset
+
+    def test_bulk_import_with_history_and_constant_queries(self):
+        coworking, workplace_type = self.existing.coworking_id, self.existing.workplace_type_id
+        rows = [[self.existing.id, 'Переговорная', coworking, workplace_type, '250', '1']]
+        rows += [['', f'Стол {i}', coworking, workplace_type, '100', '1'] for i in range(300)]
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            result = WorkplaceBulkResource().import_data(self.dataset(rows), dry_run=False, use_transactions=True)
+        self.assertFalse(result.has_errors() or result.has_validation_errors())
+        self.assertLess(len(queries), 30)
+
+        self.assertEqual(Workplace.objects.count(), 301)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.price_per_hour), ('Переговорная', 250))
+        self.assertEqual(Workplace.history.filter(history_type='+').count(), 301)
+        self.assertEqual(Workplace.history.filter(id=self.existing.id, history_type='~').count(), 1)
+        found = search.search(Workplace.objects.all(), ['Переговорная']).values_list('pk', flat=True)
+        self.assertEqual(list(found), [self.existing.id])
+
+    def test_unknown_related_object_is_row_error(self):
+        rows = [['', 'Стол', 999999, self.existing.workplace_type_id, '100', '1']]
+        result = WorkplaceBulkResource().import_data(self.dataset(rows), dry_run=True, use_transactions=True)
+        self.assertEqual([row.number for row in result.invalid_rows], [1])
+        self.assertEqual(Workplace.objects.count(), 1)
+
+
+@override_settings(HISTORY_DEFERRED='commit')
+class DeferredHistoryTests(TestCase):
+    def test_request_history_written_once_with_user(self):
+        user = User.objects.create(username='manager')
+        self.client.force_login(user)
+        workplaces = make_workplaces(3)
+        Workplace.history.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with deferred_history():
+                for workplace in workplaces:
+                    workplace.save()
+                try:
+                    with transaction.atomic():
+                        workplaces[0].save()
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.assertFalse(Workplace.history.exists())
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('coworking_api:workplace-deactivate', args=[workplaces[1].id]))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Workplace.history.count(), 4)
+        record = Workplace.history.latest('history_date')
+        self.assertEqual((record.id, record.is_active, record.history_user), (workplaces[1].id, False, user))
+        self.assertFalse([q for q in queries if 'historicalworkplace' in q['sql'].lower()])
+
+    def test_same_records_and_signals_as_library(self):
+        workplace = make_workplaces(1)[0]
+        sent = []
+
+        def receiver(signal, sender, history_instance, **kwargs):
+            sent.append((signal, history_instance.history_type))
+
+        for signal in (pre_create_historical_record, post_create_historical_record):
+            signal.connect(receiver, sender=Workplace.history.model)
+            self.addCleanup(signal.disconnect, receiver, sender=Workplace.history.model)
+
+        with override_settings(HISTORY_DEFERRED=None):
+            workplace.save()
+        with self.captureOnCommitCallbacks(execute=True), deferred_history():
+            workplace.save()
+
+        expected = [(pre_create_historical_record, '~'), (post_create_historical_record, '~')] * 2
+        self.assertEqual(sent, expected)
+        direct, deferred = Workplace.history.order_by('history_id').values()[1:]
+        for row in (direct, deferred):
+            del row['history_id'], row['history_date'], row['updated_at']
+        self.assertEqual(direct, deferred)
+
+
+@override_settings(HISTORY_DEFERRED='queue')
+class QueuedHistoryTests(TransactionTestCase):
+    def test_background_writer(self):
+        workplace = make_workplaces(1)[0]
+        with deferred_history():
+            workplace.name = 'Новое имя'
+            workplace.save()
+        wait_for_history()
+        self.assertEqual(Workplace.history.latest('history_date').name, 'Новое имя')
+
+
+class CompactHistoryTests(TestCase):
+    def test_collapses_and_archives_old_rows(self):
+        workplace = make_workplaces(1)[0]
+        long_ago = timezone.now() - timedelta(days=400)
+        for name in ['Стол', 'Стол', 'Стол у окна', 'Стол у окна']:
+            workplace.name = name
+            workplace._history_date = long_ago
+            workplace.save()
+            long_ago += timedelta(days=1)
+        del workplace._history_date
+        workplace.save()
+        workplace.save()
+        Workplace.history.filter(history_type='+').update(history_date=long_ago - timedelta(days=10))
+
+        call_command('compact_history', '--keep-days', '30', '--batch-size', '2', stdout=StringIO())
+
+        # Остались только недавние записи, в том числе повторное сохранение без изменений
+        self.assertEqual(Workplace.history.count(), 2)
+        table = Workplace.history.model._meta.db_table
+        with connection.cursor() as cursor:
+            archives = [name for name in connection.introspection.table_names(cursor) if name.startswith(f'{table}_archive_')]
+            names = []
+            for archive in archives:
+                cursor.execute(f'SELECT name FROM {archive} ORDER BY history_date')
+                names += [row[0] for row in cursor.fetchall()]
+        # '+', первое 'Стол', 'Стол у окна'; повторы без изменений удалены
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[-2:], ['Стол', 'Стол у окна'])
+
+
+class CoworkingRatingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user')
+        self.client.force_login(self.user)
+        self.coworkings = [
+            Coworking.objects.create(name=name, address='Адрес', description='Описание')
+            for name in ('Первый', 'Второй')
+        ]
+
+    def review(self, coworking, rating):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('coworking:review_create', args=[coworking.id]), {'rating': rating, 'comment': 'Текст'}
+            )
+        return Review.objects.latest('id')
+
+    def test_incremental_updates_and_ordering(self):
+        first, second = self.coworkings
+        self.review(first, 3)
+        removed = self.review(first, 5)
+        self.review(second, 4)
+        first.refresh_from_db()
+        self.assertEqual((first.rating_avg, first.rating_count), (4.0, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            removed.delete()
+        first.refresh_from_db()
+        self.assertEqual((first.rating_avg, first.rating_count), (3.0, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('coworking_api:coworking-list'), {'ordering': '-rating_avg'})
+        self.assertEqual([(c['name'], c['rating_avg']) for c in response.json()['results']], [('Второй', 4.0), ('Первый', 3.0)])
+        # План того самого запроса страницы: индекс без досортировки во временном B-дереве
+        sql = next(q['sql'] for q in queries.captured_queries if 'ORDER BY' in q['sql'] and 'LIMIT' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('coworking_rating_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_save_keeps_concurrent_rating(self):
+        coworking = Coworking.objects.get(pk=self.coworkings[0].pk)
+        self.review(self.coworkings[0], 5)
+        # Объект загружен до отзыва; сохранение формы не должно вернуть старый рейтинг
+        coworking.name = 'Переименован'
+        coworking.save()
+        coworking.refresh_from_db()
+        self.assertEqual((coworking.name, coworking.rating_avg, coworking.rating_count), ('Переименован', 5.0, 1))
+
+    def test_rebuild_fixes_drift(self):
+        self.review(self.coworkings[0], 2)
+        Coworking.objects.update(rating_avg=0, rating_count=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.coworkings[0].refresh_from_db()
+        self.assertEqual((self.coworkings[0].rating_avg, self.coworkings[0].rating_count), (2.0, 1))
+
+
+class OccupancyTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+        self.workplaces = make_workplaces(2)
+        status = BookingStatus.objects.create(name='Активно')
+        # Понедельник 10:00–12:30 и пересекающаяся бронь 12:00–13:00, вторник 23:30 — среда 00:30
+        for workplace, start, end in [
+            (0, datetime(2026, 3, 2, 10), datetime(2026, 3, 2, 12, 30)),
+            (0, datetime(2026, 3, 2, 12), datetime(2026, 3, 2, 13)),
+            (1, datetime(2026, 3, 3, 23, 30), datetime(2026, 3, 4, 0, 30)),
+        ]:
+            Booking.objects.create(
+                user=User.objects.get(), workplace=self.workplaces[workplace], status=status, total_price=0,
+                start_time=timezone.make_aware(start), end_time=timezone.make_aware(end)
+            )
+
+    def test_refresh_and_report(self):
+        call_command('refresh_occupancy', '--date-from', '2026-03-02', '--date-to', '2026-03-03', stdout=StringIO())
+        self.assertEqual(WorkplaceOccupancy.objects.count(), 4)
+        monday = WorkplaceOccupancy.objects.get(workplace=self.workplaces[0], date='2026-03-02')
+        self.assertEqual(monday.busy_minutes, 180)
+        self.assertEqual(monday.hourly[9:14], [0, 60, 60, 60, 0])
+
+        # Без параметров досчитываются только новые дни — среда и дальше, до вчера
+        output = StringIO()
+        call_command('refresh_occupancy', stdout=output)
+        tuesday_night = WorkplaceOccupancy.objects.get(workplace=self.workplaces[1], date='2026-03-04')
+        self.assertEqual(tuesday_night.hourly[0], 30)
+        self.assertEqual(WorkplaceOccupancy.objects.filter(date='2026-03-02').count(), 2)
+
+        response = self.client.get(
+            reverse('coworking_api:occupancy-list'), {'date_from': '2026-03-02', 'date_to': '2026-03-03'}
+        )
+        data = response.json()
+        self.assertEqual(data['workplaces'][0], {'workplace': self.workplaces[0].id, 'busy_minutes': 180, 'utilization': 0.0625})
+        self.assertEqual(data['by_weekday'][0], 0.0625)
+        self.assertEqual(data['weekday_hour'][1][23], 0.25)
+        self.assertEqual(data['by_hour'][10], 0.25)
+
+    @override_settings(TIME_ZONE='Europe/Berlin')
+    def test_day_with_clock_change(self):
+        # 30.03.2025 в Берлине 23 часа: после 02:00 сразу 03:00. Бронь 01:00–04:00 — это два часа
+        Booking.objects.create(
+            user=User.objects.get(), workplace=self.workplaces[0], status=BookingStatus.objects.get(), total_price=0,
+            start_time=timezone.make_aware(datetime(2025, 3, 30, 1)),
+            end_time=timezone.make_aware(datetime(2025, 3, 30, 4)),
+        )
+        call_command('refresh_occupancy', '--date-from', '2025-03-29', '--date-to', '2025-03-31', stdout=StringIO())
+        day = WorkplaceOccupancy.objects.get(workplace=self.workplaces[0], date='2025-03-30')
+        self.assertEqual((day.busy_minutes, day.hourly[:5]), (120, [0, 60, 0, 60, 0]))
+        self.assertEqual(WorkplaceOccupancy.objects.filter(busy_minutes__gt=0).count(), 1)
+
+
+class RevenueTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.workplace = make_workplaces(1)[0]
+        self.paid = PaymentStatus.objects.create(name='Оплачен')
+        self.booking_status = BookingStatus.objects.create(name='Активно')
+        self.day = timezone.make_aware(datetime(2026, 3, 2, 12))
+
+    def pay(self, amount, method='card'):
+        booking = Booking.objects.create(
+            user=self.admin, workplace=self.workplace, status=self.booking_status, total_price=amount,
+            start_time=self.day, end_time=self.day + timedelta(hours=1)
+        )
+        return Payment.objects.create(
+            booking=booking, amount=amount, payment_method=method, payment_date=self.day, status=self.paid
+        )
+
+    def test_rollup_follows_payments(self):
+        first = self.pay(100)
+        self.pay(50)
+        row = DailyRevenue.objects.get()
+        self.assertEqual((row.amount, row.payments_count), (150, 2))
+
+        # Смена способа оплаты переносит платёж в другую строку
+        first.payment_method = 'cash'
+        first.save()
+        self.assertEqual(
+            sorted(DailyRevenue.objects.values_list('payment_method', 'amount', 'payments_count')),
+            [('card', 50, 1), ('cash', 100, 1)]
+        )
+        first.delete()
+        self.assertEqual(list(DailyRevenue.objects.values_list('payment_method', flat=True)), ['card'])
+
+        DailyRevenue.objects.all().delete()
+        call_command('rebuild_revenue', stdout=StringIO())
+        self.client.force_login(self.admin)
+        data = self.client.get(
+            reverse('coworking_api:revenue-list'), {'date_from': '2026-03-01', 'date_to': '2026-03-31'}
+        ).json()
+        self.assertEqual((data['amount'], data['payments_count']), ('50.00', 1))
+        self.assertEqual(data['by_status'], [{'status': 'Оплачен', 'amount': '50.00', 'payments_count': 1}])
+        self.assertEqual(data['by_day'][0]['date'], '2026-03-02')
+
+
+class BenchmarkCommandsTests(TestCase):
+    def test_seed_and_benchmark(self):
+        call_command(
+            'seed_data', '--coworkings', '2', '--workplaces', '3', '--users', '5', '--bookings', '60',
+            '--reviews', '10', '--favorites', '4', '--days', '20', stdout=StringIO()
+        )
+        self.assertEqual(Booking.objects.count(), 60)
+        self.assertEqual(UserFavorite.objects.count(), 4)
+        # Выручка, посчитанная по ходу, совпадает с пересчётом по платежам
+        seeded = sorted(DailyRevenue.objects.values_list('date', 'coworking', 'payment_method', 'amount', 'payments_count'))
+        call_command('rebuild_revenue', stdout=StringIO())
+        self.assertEqual(
+            seeded, sorted(DailyRevenue.objects.values_list('date', 'coworking', 'payment_method', 'amount', 'payments_count'))
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = f'{directory}/run.json'
+            call_command('benchmark_urls', '--repeat', '2', '--warmup', '0', '--output', output, stdout=StringIO())
+            with open(output, encoding='utf-8') as f:
+                results = json.load(f)['results']
+        self.assertEqual(results['coworking:coworking_list']['status'], 200)
+        self.assertEqual(results['coworking_api:revenue-list']['status'], 200)
+        self.assertGreater(results['coworking:booking_list']['queries'], 0)
+        self.assertNotIn('coworking_api:booking-batch', results)
+        # Права администратора выдавались только на время замера
+        self.assertFalse(User.objects.filter(is_staff=True).exists())
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        make_workplaces(1)
+        metrics.reset()
+        cache.clear()
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('coworking:coworking_list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('coworking:metrics')).status_code, 404)
+
+    @override_settings(REQUEST_METRICS=True, METRICS_TOKEN='secret')
+    def test_metrics_access(self):
+        url = reverse('coworking:metrics')
+        # За nginx все клиенты приходят с 127.0.0.1 — адрес сам по себе доступа не даёт
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    @override_settings(REQUEST_METRICS=True)
+    def test_server_timing_only_for_trusted(self):
+        url = reverse('coworking:coworking_list')
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        self.assertIn('Server-Timing', self.client.get(url))
+        # Метрики при этом собираются по обоим запросам
+        body = metrics.render()
+        self.assertIn('coworking_requests_total{view="coworking:coworking_list",method="GET",status="200"} 2', body)
+
+    @override_settings(REQUEST_METRICS=True, METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_server_timing_and_prometheus(self):
+        response = self.client.get(reverse('coworking:coworking_list'))
+        self.assertRegex(response['Server-Timing'], r'^sql;desc="[1-9]\d* queries";dur=[\d.]+, total;dur=[\d.]+$')
+        self.client.get(reverse('coworking_api:coworking-list'))
+
+        body = self.client.get(reverse('coworking:metrics')).content.decode()
+        self.assertIn('coworking_requests_total{view="coworking:coworking_list",method="GET",status="200"} 1', body)
+        self.assertIn('coworking_request_queries_count{view="coworking_api:coworking-list",method="GET"} 1', body)
+        self.assertIn(
+            'coworking_request_duration_seconds_bucket{view="coworking:coworking_list",method="GET",le="+Inf"} 1', body
+        )
+        self.assertIn('coworking_api_cache_requests_total{result="miss"} 1', body)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.coworking = make_workplaces(1)[0].coworking
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_profiles_selected_requests(self):
+        with override_settings(
+            PROFILE_REQUESTS=True, PROFILE_SAMPLE_RATE=0, PROFILE_PATHS=[r'^/coworking/\d+/$'],
+            PROFILE_DIR=self.directory, PROFILE_MAX_FILES=2
+        ):
+            self.client.get(reverse('coworking:coworking_list'))
+            for _ in range(3):
+                self.client.get(reverse('coworking:coworking_detail', args=[self.coworking.pk]))
+            # Заголовок от анонимного пользователя не действует, в том числе через прокси с 127.0.0.1
+            self.client.get(reverse('coworking:coworking_list'), HTTP_X_PROFILE='1', REMOTE_ADDR='10.0.0.1')
+            self.client.get(reverse('coworking:coworking_list'), HTTP_X_PROFILE='1', REMOTE_ADDR='127.0.0.1')
+
+        # Старые профили сверх PROFILE_MAX_FILES удалены
+        files = list(Path(self.directory).glob('*.folded'))
+        self.assertEqual(len(files), 2)
+        meta, _ = profiling.read(files[0])
+        self.assertEqual(meta['view'], 'coworking:coworking_detail')
+
+        output = f'{self.directory}/out'
+        call_command('profile_stacks', '--dir', self.directory, '--output', output, stdout=StringIO())
+        self.assertTrue(Path(output, 'coworking-coworking_detail.folded').exists())
+
+    def test_sampler_collapses_stacks(self):
+        def busy():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        with profiling.StackSampler(interval=0.001) as sampler:
+            busy()
+        self.assertTrue(any(stack.endswith(f'busy (coworking/tests.py:{busy.__code__.co_firstlineno})')
+                            for stack in sampler.stacks))
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        make_workplaces(1)
+        slow_queries.reset()
+        cache.clear()
+        self.addCleanup(slow_queries.detach, connection)
+
+    def test_normalize(self):
+        self.assertEqual(
+            slow_queries.normalize("SELECT *  FROM t WHERE id IN (%s, %s, %s) AND name = 'x''y' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+        )
+        self.assertEqual(slow_queries.full_scans('SCAN coworking_review\nSEARCH coworking_booking USING INDEX x'),
+                         ['coworking_review'])
+
+    @override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0)
+    def test_logs_view_plan_and_counts(self):
+        slow_queries.attach(connection=connection)
+        with self.assertLogs('coworking.slow_queries', 'WARNING') as logs:
+            for _ in range(3):
+                self.client.get(reverse('coworking:coworking_list'))
+
+        sql, entry = next(
+            (sql, entry) for sql, entry in slow_queries.report() if 'FROM "coworking_coworking"' in sql
+        )
+        self.assertEqual(entry['count'], 3)
+        self.assertEqual(entry['origins'], {'view coworking:coworking_list': 3})
+        self.assertIn('coworking_coworking', entry['plan'])
+        # Третье выполнение того же запроса в лог не пишется — только 1-е и 2-е
+        self.assertEqual(sum(sql in line for line in logs.output), 2)
+        self.assertFalse([sql for sql, _ in slow_queries.report() if sql.startswith(('SAVEPOINT', 'RELEASE'))])
+
+        # Запросы самого /metrics в журнал уже не нужны
+        slow_queries.detach(connection)
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            body = self.client.get(reverse('coworking:metrics')).content.decode()
+        self.assertRegex(
+            body, r'coworking_slow_queries_total\{query="\w{12}",origin="view coworking:coworking_list"\} 3'
+        )
+        self.assertIn('coworking_slow_query_info{query=', body)
+
+    @override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0)
+    def test_failed_query_is_not_explained(self):
+        slow_queries.attach(connection=connection)
+        # Точка сохранения и откат к ней тоже не пишутся
+        with self.assertNoLogs('coworking.slow_queries'), self.assertRaises(DatabaseError), \
+                transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT * FROM no_such_table')
+        self.assertFalse([sql for sql, _ in slow_queries.report() if 'no_such_table' in sql])
@@ -33,6 +33,10 @@ urlpatterns = [
     path('bookings/<int:pk>/edit/', views.booking_update, name='booking_update'),
     path('bookings/<int:pk>/cancel/', views.booking_cancel, name='booking_cancel'),
     path('bookings/<int:booking_id>/payment/', views.booking_payment, name='booking_payment'),
+    path('bookings/export/', views.booking_export, name='booking_export'),
 
     path('favorites/', views.favorite_list, name='favorite_list'),
+
+    # Метрики для Prometheus — по его соглашению без слэша на конце
+    path('metrics', views.prometheus_metrics, name='metrics'),
 ]
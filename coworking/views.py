@@ -11,6 +11,19 @@ from django.contrib import messages
 from .models import Coworking, Review
 from .forms import ReviewForm
 from .models import Workplace, UserFavorite
+from .forms import BOOKING_CONFLICT_MESSAGE
+from . import metrics, slow_queries
+from .availability import workplace_busy_by_date, lock_workplace, has_conflicts
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.core.paginator import Paginator
+from django.views.decorators.http import condition
+from .conditional import coworking_content_version, coworking_detail_etag, workplace_detail_etag
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from .exports import FORMATS, export_lines, export_rows
 
 # Проверка, является ли пользователь админом
 def is_admin(user):
@@ -21,32 +34,54 @@ def is_admin(user):
 # -----------------------------
 
 def coworking_list(request):
-    coworkings = Coworking.objects.all()
+    # Путь к первому изображению берём подзапросом — один запрос на всю страницу
+    first_image = CoworkingImage.objects.filter(
+        coworking=OuterRef('pk'),
+        image__isnull=False
+    ).exclude(image='').order_by('pk').values('image')[:1]
+    coworkings = Coworking.objects.annotate(first_image_path=Subquery(first_image))
 
-    # Для каждого коворкинга выбираем первое изображение (или None)
     for coworking in coworkings:
-        coworking.first_image = coworking.images.filter(image__isnull=False).first()
+        coworking.first_image = None
+        if coworking.first_image_path:
+            # Несохранённый объект нужен только ради image.url в шаблоне
+            coworking.first_image = CoworkingImage(coworking=coworking, image=coworking.first_image_path)
 
     return render(request, 'coworking/coworking_list.html', {
         'coworkings': coworkings
     })
 
+@condition(etag_func=coworking_detail_etag)
 def coworking_detail(request, pk):
     coworking = get_object_or_404(Coworking, pk=pk)
 
-    workplaces = coworking.workplaces.all()
+    # Общая часть страницы кэшируется по версии коворкинга (меняется при правке коворкинга,
+    # его мест, фото и отзывов); персональные сердечки накладываются поверх при каждом запросе
+    content_version = coworking_content_version(request, coworking.pk)
+    timeout = settings.COWORKING_DETAIL_CACHE_TIMEOUT
+
+    workplaces = cache.get_or_set(
+        f'coworking_detail:{coworking.pk}:{content_version}:workplaces',
+        lambda: list(coworking.workplaces.select_related('workplace_type')),
+        timeout
+    )
 
+    # Ленивый queryset: выполняется, только если фрагмент отзывов не найден в кэше
     reviews = Review.objects.filter(coworking=coworking).select_related('user').order_by('-created_at')
 
-    user_favorites = []
+    user_favorites = set()
     if request.user.is_authenticated:
-        user_favorites = request.user.userfavorite_set.values_list('workplace_id', flat=True)
+        user_favorites = set(request.user.userfavorite_set.filter(
+            workplace__coworking=coworking
+        ).values_list('workplace_id', flat=True))
 
     context = {
         'coworking': coworking,
         'workplaces': workplaces,
         'reviews': reviews,
         'user_favorites': user_favorites,
+        'content_version': content_version,
+        'cache_timeout': timeout,
     }
     return render(request, 'coworking/coworking_detail.html', context)
 
@@ -110,6 +145,7 @@ def workplace_list(request, coworking_id):
     })
 
 # Детальная страница рабочего места
+@condition(etag_func=workplace_detail_etag)
 def workplace_detail(request, pk):
     workplace = get_object_or_404(Workplace, id=pk)
 
@@ -258,79 +294,63 @@ def booking_create(request, workplace_id):
     from django.conf import settings
     LOCAL_TZ = timezone.get_current_timezone()
     
-    # Получаем все активные бронирования для этого места
-    now_utc = timezone.now()
-    
-    existing_bookings = Booking.objects.filter(
-        workplace=workplace,
-        end_time__gte=now_utc - timedelta(hours=1)
-    ).order_by('start_time')
-
-    # Формируем busy_slots в локальном времени
-    busy_slots = []
-    for booking in existing_bookings:
-        # Конвертируем время бронирования в локальный часовой пояс
-        start_local = timezone.localtime(booking.start_time, LOCAL_TZ)
-        end_local = timezone.localtime(booking.end_time, LOCAL_TZ)
-        
-        current = start_local
-        while current < end_local:
-            busy_slots.append({
-                'date': current.date(),
-                'hour': current.hour,
-                'datetime': current
-            })
-            current += timedelta(hours=1)
-
     if request.method == 'POST':
         form = BookingForm(request.POST, workplace=workplace)
         if form.is_valid():
             start_time = form.cleaned_data['start_time']
             end_time = form.cleaned_data['end_time']
 
-            duration_hours = Decimal((end_time - start_time).total_seconds() / 3600)
-            total_price = workplace.price_per_hour * duration_hours
+            total_price = workplace.price_for(start_time, end_time)
 
             status, _ = BookingStatus.objects.get_or_create(name='Активно')
 
-            Booking.objects.create(
-                user=request.user,
-                workplace=workplace,
-                start_time=start_time,
-                end_time=end_time,
-                status=status,
-                total_price=total_price
-            )
-
-            return redirect('coworking:booking_list')
+            # Проверка и вставка атомарны: параллельные брони этого места ждут блокировки
+            with transaction.atomic():
+                lock_workplace(workplace)
+                if not has_conflicts(workplace, start_time, end_time):
+                    Booking.objects.create(
+                        user=request.user,
+                        workplace=workplace,
+                        start_time=start_time,
+                        end_time=end_time,
+                        status=status,
+                        total_price=total_price
+                    )
+                    return redirect('coworking:booking_list')
+            form.add_error(None, BOOKING_CONFLICT_MESSAGE)
     else:
         form = BookingForm(workplace=workplace)
 
-    # Группируем занятые слоты по дням
-    busy_by_date = {}
-    for slot in busy_slots:
-        date_str = slot['date'].strftime('%Y-%m-%d')
-        if date_str not in busy_by_date:
-            busy_by_date[date_str] = []
-        busy_by_date[date_str].append(slot['hour'])
-
-    for date_str in busy_by_date:
-        busy_by_date[date_str].sort()
+    busy_by_date = workplace_busy_by_date(workplace)
 
     return render(request, 'coworking/booking_form.html', {
         'workplace': workplace,
         'form': form,
-        'busy_slots': busy_slots,
         'busy_by_date': busy_by_date,
         'current_time': timezone.localtime(timezone.now(), LOCAL_TZ).strftime('%Y-%m-%d %H:%M')  # Для отладки
     })
 
+BOOKINGS_PER_PAGE = 10
+
+
 @login_required
 def booking_list(request):
-    # Показываем только бронирования текущего пользователя
-    bookings = Booking.objects.filter(user=request.user).order_by('-start_time')
+    # Показываем только бронирования текущего пользователя;
+    # место, коворкинг, статус и оплату подтягиваем JOIN-ами, а не запросом на каждую строку
+    bookings = Booking.objects.filter(user=request.user).select_related(
+        'workplace__coworking', 'status', 'payment'
+    )
+    now = timezone.now()
+
+    upcoming = bookings.filter(end_time__gte=now).order_by('start_time')
+
+    # Прошедших броней может быть много — показываем их постранично
+    past = bookings.filter(end_time__lt=now).order_by('-start_time')
+    past_page = Paginator(past, BOOKINGS_PER_PAGE).get_page(request.GET.get('page'))
+
     return render(request, 'coworking/booking_list.html', {
-        'bookings': bookings
+        'upcoming_bookings': upcoming,
+        'past_page': past_page,
     })
 
 @login_required
@@ -351,35 +371,8 @@ def booking_update(request, pk):
         'end_hour': end_local.hour,
     }
 
-    # Получаем занятые слоты в локальном времени
-    now_utc = timezone.now()
-    existing_bookings = Booking.objects.filter(
-        workplace=booking.workplace,
-        end_time__gte=now_utc - timedelta(hours=1)
-    ).exclude(id=booking.id).order_by('start_time')
-    
-    busy_slots = []
-    for b in existing_bookings:
-        b_start_local = timezone.localtime(b.start_time, LOCAL_TZ)
-        b_end_local = timezone.localtime(b.end_time, LOCAL_TZ)
-        current = b_start_local
-        while current < b_end_local:
-            busy_slots.append({
-                'date': current.date(),
-                'hour': current.hour,
-            })
-            current += timedelta(hours=1)
-    
-    # Группируем по дням
-    busy_by_date = {}
-    for slot in busy_slots:
-        date_str = slot['date'].strftime('%Y-%m-%d')
-        if date_str not in busy_by_date:
-            busy_by_date[date_str] = []
-        busy_by_date[date_str].append(slot['hour'])
-    
-    for date_str in busy_by_date:
-        busy_by_date[date_str].sort()
+    # Занятые часы других броней этого места
+    busy_by_date = workplace_busy_by_date(booking.workplace, exclude_booking=booking)
 
     if request.method == 'POST':
         form = BookingForm(
@@ -391,11 +384,14 @@ def booking_update(request, pk):
             booking.start_time = form.cleaned_data['start_time']
             booking.end_time = form.cleaned_data['end_time']
             
-            duration_hours = Decimal((booking.end_time - booking.start_time).total_seconds() / 3600)
-            booking.total_price = booking.workplace.price_per_hour * duration_hours
-            
-            booking.save()
-            return redirect('coworking:booking_list')
+            booking.total_price = booking.workplace.price_for(booking.start_time, booking.end_time)
+
+            with transaction.atomic():
+                lock_workplace(booking.workplace_id)
+                if not has_conflicts(booking.workplace_id, booking.start_time, booking.end_time, exclude_booking=booking):
+                    booking.save()
+                    return redirect('coworking:booking_list')
+            form.add_error(None, BOOKING_CONFLICT_MESSAGE)
     else:
         form = BookingForm(
             initial=initial,
@@ -427,13 +423,15 @@ def booking_payment(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, user=request.user)
 
     if request.method == 'POST':
-        Payment.objects.create(
-            booking=booking,
-            amount=booking.total_price,
-            payment_method=request.POST.get('payment_method', 'условно'),
-            payment_date=timezone.now(),
-            status=PaymentStatus.objects.get(name='Оплачен')
-        )
+        # платёж и выручка за день (signals.py) сохраняются вместе
+        with transaction.atomic():
+            Payment.objects.create(
+                booking=booking,
+                amount=booking.total_price,
+                payment_method=request.POST.get('payment_method', 'условно'),
+                payment_date=timezone.now(),
+                status=PaymentStatus.objects.get(name='Оплачен')
+            )
         return redirect('coworking:booking_list')
 
     return render(request, 'coworking/booking_payment.html', {
@@ -441,6 +439,39 @@ def booking_payment(request, booking_id):
     })
 
 
+# Выгрузка бронирований с оплатами для бухгалтерии:
+# /bookings/export/?format=csv|ndjson&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&coworking=<id>
+@login_required
+@user_passes_test(is_admin)
+def booking_export(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest('Формат выгрузки: csv или ndjson')
+
+    filters = {}
+    for name in ('date_from', 'date_to'):
+        value = request.GET.get(name)
+        if value:
+            try:
+                filters[name] = parse_date(value)
+            except ValueError:
+                filters[name] = None
+            if filters[name] is None:
+                return HttpResponseBadRequest(f'{name}: ожидается дата в формате ГГГГ-ММ-ДД')
+    coworking = request.GET.get('coworking')
+    if coworking:
+        if not coworking.isdigit():
+            return HttpResponseBadRequest('coworking: ожидается id коворкинга')
+        filters['coworking'] = int(coworking)
+
+    response = StreamingHttpResponse(
+        export_lines(export_format, export_rows(**filters)),
+        content_type=FORMATS[export_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="bookings.{export_format}"'
+    return response
+
+
 @login_required
 def review_create(request, coworking_id):
     coworking = get_object_or_404(Coworking, id=coworking_id)
@@ -451,7 +482,9 @@ def review_create(request, coworking_id):
             review = form.save(commit=False)
             review.user = request.user
             review.coworking = coworking
-            review.save()
+            # отзыв и рейтинг коворкинга (signals.py) сохраняются вместе
+            with transaction.atomic():
+                review.save()
             return redirect('coworking:coworking_detail', pk=coworking.id)
     else:
         form = ReviewForm()
@@ -481,4 +514,17 @@ def favorite_list(request):
     favorites = Workplace.objects.filter(userfavorite__user=request.user)
     return render(request, 'coworking/favorite_list.html', {
         'favorites': favorites
-    })
\ No newline at end of file
+    })
+
+
+def prometheus_metrics(request):
+    # Метрики запросов для Prometheus (coworking/metrics.py) и счётчики журнала медленных SQL
+    # (slow_queries.py): сборщику по METRICS_TOKEN или METRICS_ALLOWED_IPS и администраторам
+    if not metrics.is_enabled() and not slow_queries.is_enabled():
+        raise Http404('Сбор метрик выключен (REQUEST_METRICS, SLOW_QUERY_LOG)')
+    if not metrics.is_trusted(request):
+        return HttpResponse(status=403)
+    body = metrics.render()
+    if slow_queries.is_enabled():
+        body += slow_queries.render()
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')